@@ -53,10 +53,13 @@ class AlertsClient {
             guard let self else { return }
             switch result {
             case .success(let message):
+                // Server sends JSON in binary frames; accept text too
                 switch message {
                 case .string(let text):
-                    self.handleMessage(text)
-                default:
+                    if let data = text.data(using: .utf8) { self.handleMessage(data) }
+                case .data(let bytes):
+                    self.handleMessage(bytes)
+                @unknown default:
                     break
                 }
                 self.listen() // continue listening
@@ -68,9 +71,8 @@ class AlertsClient {
         }
     }
 
-    private func handleMessage(_ text: String) {
-        guard let data = text.data(using: .utf8),
-              let json = try? JSONSerialization.jsonObject(with: data) as? [String: Any],
+    private func handleMessage(_ data: Data) {
+        guard let json = try? JSONSerialization.jsonObject(with: data) as? [String: Any],
               let type = json["type"] as? String else { return }
 
         switch type {
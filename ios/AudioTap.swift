@@ -1,6 +1,10 @@
 import AVFoundation
 
 class AudioTap {
+    // First byte of each binary message on /ws/audio
+    private static let pcmTag: UInt8 = 0x00
+    private static let jpegTag: UInt8 = 0x01
+
     private let callId: String
     private var engine = AVAudioEngine()
     private var webSocket: URLSessionWebSocketTask?
@@ -48,7 +52,8 @@ class AudioTap {
 
         inputNode.installTap(onBus: 0, bufferSize: 4096, format: inputNode.outputFormat(forBus: 0)) { [weak self] buffer, _ in
             guard let self, let converted = self.convert(buffer: buffer, to: format) else { return }
-            let data = Data(buffer: converted.int16ChannelData![0].withMemoryRebound(to: UInt8.self, capacity: Int(converted.frameLength) * 2) {
+            var data = Data([AudioTap.pcmTag])
+            data.append(converted.int16ChannelData![0].withMemoryRebound(to: UInt8.self, capacity: Int(converted.frameLength) * 2) {
                 UnsafeBufferPointer(start: $0, count: Int(converted.frameLength) * 2)
             })
             self.webSocket?.send(.data(data)) { _ in }
@@ -78,10 +83,10 @@ class AudioTap {
 
     private func captureAndSendFrame() {
         guard let jpeg = webRTCManager?.captureJPEG() else { return }
-        let payload: [String: Any] = ["type": "frame", "data": jpeg.base64EncodedString()]
-        guard let json = try? JSONSerialization.data(withJSONObject: payload),
-              let jsonStr = String(data: json, encoding: .utf8) else { return }
-        webSocket?.send(.string(jsonStr)) { _ in }
+        // Raw JPEG in a binary frame — no base64/JSON wrapping
+        var data = Data([AudioTap.jpegTag])
+        data.append(jpeg)
+        webSocket?.send(.data(data)) { _ in }
     }
 
     @objc private func handleRouteChange(_ notification: Notification) {
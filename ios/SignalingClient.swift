@@ -35,8 +35,14 @@ class SignalingClient: NSObject {
             switch result {
             case .success(let message):
                 print("[SignalingClient] received message")
-                if case .string(let text) = message,
-                   let data = text.data(using: .utf8),
+                // Server sends JSON in binary frames; relayed SDP/ICE stays text
+                let data: Data?
+                switch message {
+                case .string(let text): data = text.data(using: .utf8)
+                case .data(let bytes):  data = bytes
+                @unknown default:       data = nil
+                }
+                if let data,
                    let json = try? JSONSerialization.jsonObject(with: data) as? [String: Any] {
                     self?.delegate?.signalingClient(self!, didReceive: json)
                 }
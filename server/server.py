@@ -1,41 +1,179 @@
+import array
 import asyncio
 import base64
 import io
-import json
 import logging
 import math
 import os
 import struct
+import sys
 import time
 import uuid
-import wave
+import warnings
+from dataclasses import dataclass
 from typing import Optional
 
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    import audioop  # C-implemented PCM ops; provided by audioop-lts on Python 3.13+
+
 from dotenv import load_dotenv
 load_dotenv()
 
 import aiohttp
+import orjson
 from aiohttp import web
 from google import genai
 from google.genai import types
 
+try:
+    import av  # PyAV — encodes Gemini uploads as Ogg/Opus instead of WAV
+except ImportError:
+    av = None
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # ─── State ────────────────────────────────────────────────────────────────────
 
-active_calls: dict[str, dict] = {}
-# Structure per call_id:
-# {
-#   "caller_ws": WebSocketResponse,
-#   "dispatcher_ws": Optional[WebSocketResponse],
-#   "dashboard_ws": Optional[WebSocketResponse],
-#   "gemini_task": Optional[asyncio.Task],
-#   "location": {"lat": float, "lng": float},
-#   "started_at": float,
-# }
+class PcmRing:
+    """Fixed-size byte ring for a call's PCM; overflow overwrites the oldest audio.
+
+    Writes are slice copies into a preallocated bytearray, so the socket reader
+    allocates nothing per frame and never wakes the consumer task.
+    """
+    __slots__ = ("_buf", "_start", "_len", "closed", "dropped")
+
+    def __init__(self, capacity: int) -> None:
+        self._buf = bytearray(capacity)
+        self._start = 0
+        self._len = 0
+        self.closed = False
+        self.dropped = 0  # bytes overwritten since the owner last reset it
+
+    def __len__(self) -> int:
+        return self._len
+
+    def write(self, data) -> None:
+        buf, cap, n = self._buf, len(self._buf), len(data)
+        if n >= cap:
+            # Larger than the ring — only the newest `cap` bytes survive
+            self.dropped += self._len + n - cap
+            buf[:] = data[n - cap:]
+            self._start, self._len = 0, cap
+            return
+        end = (self._start + self._len) % cap
+        first = min(n, cap - end)
+        buf[end:end + first] = data[:first]
+        buf[:n - first] = data[first:]
+        overflow = self._len + n - cap
+        if overflow > 0:
+            self.dropped += overflow
+            self._start = (self._start + overflow) % cap
+            self._len = cap
+        else:
+            self._len += n
+
+    def drain(self) -> bytes:
+        """Return everything buffered, oldest first, and empty the ring."""
+        start, end, buf = self._start, self._start + self._len, self._buf
+        if end <= len(buf):
+            out = bytes(buf[start:end])
+        else:
+            out = bytes(buf[start:]) + bytes(buf[:end - len(buf)])
+        self._start = self._len = 0
+        return out
+
+    def close(self) -> None:
+        self.closed = True
+
+
+@dataclass(slots=True)
+class CallState:
+    """Per-call state; slots keep hot-path attribute reads cheap."""
+    caller_ws: web.WebSocketResponse
+    audio_ring: PcmRing  # PCM awaiting the next Gemini round
+    location: dict  # {"lat": float, "lng": float}
+    started_at: float
+    dispatcher_ws: Optional[web.WebSocketResponse] = None
+    dashboard_ws: Optional[web.WebSocketResponse] = None
+    gemini_task: Optional[asyncio.Task] = None
+    last_vitals: Optional[dict] = None
+    latest_frame: Optional[bytes] = None  # most recent JPEG, overwritten per frame
+    incident_id: Optional[str] = None
+    vitals_prefix: bytes = b""  # serialized '{"type":"vitals","call_id":...,' for this call
+
+
+active_calls: dict[str, CallState] = {}
 
 dispatcher_connections: set[web.WebSocketResponse] = set()
+# Immutable copy for fan-out, rebuilt only when a dashboard connects or disconnects
+_dispatchers_snapshot: tuple[web.WebSocketResponse, ...] = ()
+
+
+def _add_dispatcher(ws: web.WebSocketResponse) -> None:
+    global _dispatchers_snapshot
+    dispatcher_connections.add(ws)
+    _dispatchers_snapshot = tuple(dispatcher_connections)
+
+
+def _remove_dispatcher(ws: web.WebSocketResponse) -> None:
+    global _dispatchers_snapshot
+    dispatcher_connections.discard(ws)
+    _dispatchers_snapshot = tuple(dispatcher_connections)
+
+# ─── Dashboard Outbox ─────────────────────────────────────────────────────────
+
+def _send(ws: web.WebSocketResponse, message: dict):
+    """Send one JSON message directly as an orjson-encoded binary frame; returns the awaitable."""
+    return ws.send_bytes(orjson.dumps(message))
+
+
+# Outbound message queue per dashboard socket, drained by dashboard_writer()
+dashboard_outboxes: dict[web.WebSocketResponse, asyncio.Queue] = {}
+
+
+def _enqueue_dashboard(ws: Optional[web.WebSocketResponse], payload: bytes) -> None:
+    if ws is None or ws.closed:
+        return
+    outbox = dashboard_outboxes.get(ws)
+    if outbox is not None:
+        outbox.put_nowait(payload)
+
+
+def send_to_dashboard(ws: Optional[web.WebSocketResponse], message: dict) -> None:
+    """Queue a message for a dashboard; its writer task flushes the backlog as one frame."""
+    _enqueue_dashboard(ws, orjson.dumps(message))
+
+
+def vitals_payload(prefix: bytes, vitals: dict) -> bytes:
+    """Splice serialized vitals onto a call's prebuilt vitals prefix."""
+    if not vitals:
+        return prefix[:-1] + b"}"
+    return prefix + orjson.dumps(vitals)[1:]
+
+
+def broadcast_to_dashboards(message: dict) -> None:
+    """Queue one message for every connected dashboard, serializing it only once."""
+    payload = orjson.dumps(message)
+    for ws in _dispatchers_snapshot:
+        _enqueue_dashboard(ws, payload)
+
+
+async def dashboard_writer(ws: web.WebSocketResponse, outbox: asyncio.Queue):
+    """Coalesce everything queued for one dashboard into a single JSON array frame."""
+    while True:
+        batch = [await outbox.get()]
+        while True:
+            try:
+                batch.append(outbox.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        try:
+            await ws.send_bytes(b"[" + b",".join(batch) + b"]")
+        except ConnectionResetError:
+            return
+
 
 # ─── Community Alerts / Incident Clustering ───────────────────────────────────
 
@@ -96,43 +234,35 @@ async def broadcast_community_alert(incident_id: str):
     if not inc:
         return
 
-    payload = {
+    payload = orjson.dumps({
         "type": "community_alert",
         "incident_id": incident_id,
         "location": inc["location"],
         "severity": inc["severity_avg"],
         "report_count": inc["report_count"],
-    }
+    })
 
-    dead: list[web.WebSocketResponse] = []
+    # Send to every live subscriber concurrently so one slow socket can't stall the rest
+    live = [ws for ws in alert_subscribers if not ws.closed]
+    alert_subscribers.intersection_update(live)
+    results = await asyncio.gather(*(ws.send_bytes(payload) for ws in live), return_exceptions=True)
     sent = 0
-    for ws in alert_subscribers.copy():
-        try:
-            if ws.closed:
-                dead.append(ws)
-                continue
-            await ws.send_json(payload)
+    for ws, result in zip(live, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Dropping alert subscriber after failed send: {result!r}")
+            alert_subscribers.discard(ws)
+        else:
             sent += 1
-        except Exception:
-            dead.append(ws)
-    for ws in dead:
-        alert_subscribers.discard(ws)
 
     inc["alerted_count"] = max(inc["alerted_count"], sent)
-    payload["alerted_count"] = inc["alerted_count"]
 
     # Also push incident_update to dispatcher dashboards
-    for dash_ws in dispatcher_connections.copy():
-        if not dash_ws.closed:
-            try:
-                await dash_ws.send_json({
-                    "type": "incident_update",
-                    "incident_id": incident_id,
-                    **{k: v for k, v in inc.items() if k != "call_ids"},
-                    "report_count": inc["report_count"],
-                })
-            except Exception:
-                pass
+    broadcast_to_dashboards({
+        "type": "incident_update",
+        "incident_id": incident_id,
+        **{k: v for k, v in inc.items() if k != "call_ids"},
+        "report_count": inc["report_count"],
+    })
 
 
 # ─── Gemini ───────────────────────────────────────────────────────────────────
@@ -152,149 +282,291 @@ Output ONLY a JSON object — no preamble, no markdown, no extra text:
 Severity: 1=minor, 2=moderate, 3=urgent, 4=serious, 5=life-threatening.
 Keep output under 100 tokens. Speed over verbosity."""
 
+# Structured output — Gemini returns strict JSON matching this, no extraction needed
+TRIAGE_SCHEMA = types.Schema(
+    type=types.Type.OBJECT,
+    properties={
+        "situation_summary": types.Schema(type=types.Type.STRING),
+        "detected_keywords": types.Schema(type=types.Type.ARRAY, items=types.Schema(type=types.Type.STRING)),
+        "caller_emotional_state": types.Schema(
+            type=types.Type.STRING, enum=["calm", "distressed", "panicked", "unresponsive"]
+        ),
+        "recommended_response_type": types.Schema(
+            type=types.Type.STRING, enum=["medical", "police", "fire", "unknown"]
+        ),
+        "severity": types.Schema(type=types.Type.INTEGER),
+        "can_speak": types.Schema(type=types.Type.BOOLEAN),
+    },
+    required=[
+        "situation_summary", "detected_keywords", "caller_emotional_state",
+        "recommended_response_type", "severity", "can_speak",
+    ],
+)
+
+# Identical for every round and every call — built once instead of per request
+GEMINI_CONFIG = types.GenerateContentConfig(
+    system_instruction=SYSTEM_PROMPT,
+    temperature=0.1,
+    response_mime_type="application/json",
+    response_schema=TRIAGE_SCHEMA,
+)
+
+# Static prompt pieces: the first-round Part is prebuilt; later rounds embed context
+FIRST_ROUND_PROMPT = "Analyze this 911 call audio clip and output triage JSON."
+FRAME_NOTE = " A camera frame from the caller is also attached."
+FIRST_ROUND_PARTS = {
+    False: types.Part(text=FIRST_ROUND_PROMPT),
+    True: types.Part(text=FIRST_ROUND_PROMPT + FRAME_NOTE),
+}
+# Silent rounds send the camera frame alone, so a collapsed caller still gets triaged
+FRAME_ONLY_PROMPT = (
+    "No speech was detected in this segment. Triage from the attached camera frame "
+    "of the caller and output triage JSON."
+)
+FRAME_ONLY_PART = types.Part(text=FRAME_ONLY_PROMPT)
+
+# Fixed fields of the placeholder report sent when a round fails
+ERROR_REPORT_FIELDS = {
+    "severity": 0,
+    "caller_emotional_state": "unknown",
+    "recommended_response_type": "unknown",
+    "can_speak": True,
+    "detected_keywords": [],
+}
+
 ANALYSIS_INTERVAL = 10  # seconds between Gemini calls
 AUDIO_SAMPLE_RATE = 16000
 AUDIO_BYTES_PER_SAMPLE = 2  # 16-bit PCM
+# Two rounds of audio; a stalled round loses the oldest audio, never blocks the reader
+PCM_RING_BYTES = 2 * ANALYSIS_INTERVAL * AUDIO_SAMPLE_RATE * AUDIO_BYTES_PER_SAMPLE
+GEMINI_CANCEL_TIMEOUT = 1.0  # seconds cleanup_call waits for a cancelled analysis task
+OVERFLOW_LOG_INTERVAL = 5.0  # seconds between "dropping stale audio" warnings per call
+
+OPUS_BITRATE = 24000  # speech-quality Opus, ~10x smaller than 16kHz 16-bit PCM
+SILENCE_RMS_THRESHOLD = 200  # 16-bit RMS every 100ms window stays below for a round to count as silent
+SILENCE_WINDOW_BYTES = AUDIO_SAMPLE_RATE // 10 * AUDIO_BYTES_PER_SAMPLE  # 100ms of PCM
+FRAME_ONLY_EVERY = 3  # while silent, analyze the camera frame alone every Nth round
+
+# First byte of each BINARY message on /ws/audio
+AUDIO_TAG_PCM = 0x00
+AUDIO_TAG_JPEG = 0x01
+
+# First byte of each BINARY message on the multiplexed /ws caller socket
+MUX_TAG_SIGNAL = 0x00
+MUX_TAG_AUDIO = 0x01
+MUX_TAG_VITALS = 0x02
+MUX_TAG_FRAME = 0x03
+
+
+_gemini_client: Optional[genai.Client] = None
+
+
+def get_gemini_client() -> genai.Client:
+    """Process-wide client so all calls share one connection pool to Gemini."""
+    global _gemini_client
+    if _gemini_client is None:
+        _gemini_client = genai.Client(api_key=os.environ["GEMINI_API_KEY"])
+    return _gemini_client
+
+
+# Canonical 44-byte RIFF/WAVE header for uncompressed PCM
+WAV_HEADER = struct.Struct("<4sI4s4sIHHIIHH4sI")
+
+
+def wav_header(data_len: int, sample_rate: int, channels: int, sample_width: int) -> bytes:
+    block_align = channels * sample_width
+    return WAV_HEADER.pack(
+        b"RIFF", 36 + data_len, b"WAVE",
+        b"fmt ", 16, 1, channels, sample_rate, sample_rate * block_align, block_align, sample_width * 8,
+        b"data", data_len,
+    )
+
+
+# Header for the stream format the iOS tap sends; only the two size fields vary
+_DEFAULT_WAV_HEADER = wav_header(0, AUDIO_SAMPLE_RATE, 1, AUDIO_BYTES_PER_SAMPLE)
 
 
 def pcm_to_wav(pcm_bytes: bytes, sample_rate: int = 16000, channels: int = 1, sample_width: int = 2) -> bytes:
     """Wrap raw PCM bytes in a WAV container so Gemini generateContent can process it."""
-    buf = io.BytesIO()
-    with wave.open(buf, "wb") as wf:
-        wf.setnchannels(channels)
-        wf.setsampwidth(sample_width)
-        wf.setframerate(sample_rate)
-        wf.writeframes(pcm_bytes)
-    return buf.getvalue()
+    data_len = len(pcm_bytes)
+    if (sample_rate, channels, sample_width) == (AUDIO_SAMPLE_RATE, 1, AUDIO_BYTES_PER_SAMPLE):
+        header = bytearray(_DEFAULT_WAV_HEADER)
+        struct.pack_into("<I", header, 4, 36 + data_len)
+        struct.pack_into("<I", header, 40, data_len)
+    else:
+        header = wav_header(data_len, sample_rate, channels, sample_width)
+    return bytes(header) + pcm_bytes
+
+
+def pcm_to_ogg_opus(pcm_bytes: bytes, sample_rate: int = 16000) -> bytes:
+    """Encode mono 16-bit PCM as Opus in an Ogg container (requires PyAV)."""
+    out = io.BytesIO()
+    with av.open(out, mode="w", format="ogg") as container:
+        stream = container.add_stream("libopus", rate=sample_rate, layout="mono")
+        stream.bit_rate = OPUS_BITRATE
+        frame = av.AudioFrame(format="s16", layout="mono", samples=len(pcm_bytes) // AUDIO_BYTES_PER_SAMPLE)
+        frame.sample_rate = sample_rate
+        frame.planes[0].update(pcm_bytes)
+        for packet in stream.encode(frame):
+            container.mux(packet)
+        for packet in stream.encode(None):  # flush encoder
+            container.mux(packet)
+    return out.getvalue()
+
+
+def encode_audio(pcm_bytes: bytes) -> tuple[bytes, str]:
+    """Compress a round of PCM for upload: Ogg/Opus when PyAV is installed, else WAV."""
+    if av is not None:
+        return pcm_to_ogg_opus(pcm_bytes), "audio/ogg"
+    return pcm_to_wav(pcm_bytes), "audio/wav"
+
+
+def is_silent(pcm: bytes) -> bool:
+    """True when no 100ms window of a round of 16-bit PCM is loud enough to hold speech.
+
+    Gating on the loudest window, not the round average, keeps a few seconds of quiet
+    speech from being averaged away by the silence around it.
+    """
+    view = memoryview(pcm)
+    usable = len(view) - len(view) % AUDIO_BYTES_PER_SAMPLE
+    for start in range(0, usable, SILENCE_WINDOW_BYTES):
+        window = view[start:min(start + SILENCE_WINDOW_BYTES, usable)]
+        if audioop.rms(window, AUDIO_BYTES_PER_SAMPLE) >= SILENCE_RMS_THRESHOLD:
+            return False
+    return True
 
 
-async def gemini_session_task(call_id: str, audio_queue: asyncio.Queue, dashboard_ws_getter):
+def normalize_pcm(pcm: bytes, swap: bool, channels: int, rate: int, ratecv_state=None):
+    """Convert client 16-bit PCM to host-order mono at AUDIO_SAMPLE_RATE.
+
+    Returns (pcm, ratecv_state); pass the state back in on the next chunk so
+    resampling stays continuous across frames.
+    """
+    if swap:
+        samples = array.array("h")
+        samples.frombytes(pcm)
+        samples.byteswap()
+        pcm = samples.tobytes()
+    if channels == 2:
+        pcm = audioop.tomono(pcm, AUDIO_BYTES_PER_SAMPLE, 0.5, 0.5)
+    if rate != AUDIO_SAMPLE_RATE:
+        pcm, ratecv_state = audioop.ratecv(
+            pcm, AUDIO_BYTES_PER_SAMPLE, 1, rate, AUDIO_SAMPLE_RATE, ratecv_state
+        )
+    return pcm, ratecv_state
+
+
+async def gemini_session_task(call_id: str, call: CallState):
     """
-    Periodically drains the audio queue, sends buffered PCM (as WAV) + latest
-    video frame to Gemini generateContent, and forwards triage JSON to the dashboard.
+    Every ANALYSIS_INTERVAL drains the call's PCM ring, sends it (as Opus or WAV) + the call's
+    latest video frame to Gemini generateContent, and forwards triage JSON to the dashboard.
+
+    Holds the CallState itself, so dashboard_ws and latest_frame are plain attribute
+    reads that see updates in place — no active_calls lookup per round.
     """
-    client = genai.Client(api_key=os.environ["GEMINI_API_KEY"])
+    audio_ring = call.audio_ring
+    client = get_gemini_client()
     logger.info(f"[{call_id}] Gemini analysis task started")
 
-    audio_buffer = bytearray()
-    latest_frame: str | None = None  # base64 JPEG
     previous_summary: str = ""  # cumulative context across analysis rounds
     analysis_count = 0
+    silent_rounds = 0  # consecutive rounds without speech
+    # Constant head of every triage_update; Gemini's validated JSON is spliced in after it
+    triage_prefix = orjson.dumps({"type": "triage_update", "call_id": call_id})[:-1] + b',"report":'
 
     try:
         while True:
-            # Collect audio for ANALYSIS_INTERVAL seconds
-            deadline = asyncio.get_event_loop().time() + ANALYSIS_INTERVAL
-            while asyncio.get_event_loop().time() < deadline:
-                timeout = deadline - asyncio.get_event_loop().time()
-                try:
-                    item = await asyncio.wait_for(audio_queue.get(), timeout=timeout)
-                except asyncio.TimeoutError:
-                    break
-                if item is None:  # Sentinel — call ended
-                    return
-                if item["type"] == "audio":
-                    audio_buffer.extend(item["data"])
-                elif item["type"] == "frame":
-                    latest_frame = item["data"]  # keep most recent frame
-
-            if not audio_buffer:
+            # Audio accumulates in the ring on its own — just wake once per round
+            await asyncio.sleep(ANALYSIS_INTERVAL)
+            if audio_ring.closed:  # call ended
+                return
+            if not audio_ring:
                 continue
 
-            chunk = bytes(audio_buffer)
-            audio_buffer.clear()
+            chunk = audio_ring.drain()
+            latest_frame = call.latest_frame
+            frame_only = is_silent(chunk)
+            if frame_only:
+                silent_rounds += 1
+                # Nobody speaking — the audio isn't worth sending, but a frame can still show an
+                # unresponsive caller: analyze it on the first silent round, then every Nth
+                if not latest_frame or (silent_rounds - 1) % FRAME_ONLY_EVERY != 0:
+                    logger.info(f"[{call_id}] Skipping silent audio segment")
+                    continue
+            else:
+                silent_rounds = 0
             analysis_count += 1
 
-            duration_s = len(chunk) // (AUDIO_BYTES_PER_SAMPLE * AUDIO_SAMPLE_RATE)
-            logger.info(f"[{call_id}] Sending {duration_s}s audio to Gemini (round {analysis_count})")
-
-            # Convert raw PCM to WAV — generateContent does NOT support audio/pcm
-            wav_bytes = pcm_to_wav(chunk)
-
             try:
                 # Build content parts
-                parts: list[types.Part] = [
-                    types.Part(
+                parts: list[types.Part] = []
+                if frame_only:
+                    logger.info(f"[{call_id}] Sending frame-only round to Gemini (round {analysis_count})")
+                else:
+                    duration_s = len(chunk) // (AUDIO_BYTES_PER_SAMPLE * AUDIO_SAMPLE_RATE)
+                    logger.info(f"[{call_id}] Sending {duration_s}s audio to Gemini (round {analysis_count})")
+                    # Compress raw PCM off the event loop — generateContent does NOT support audio/pcm
+                    audio_bytes, audio_mime = await asyncio.to_thread(encode_audio, chunk)
+                    parts.append(types.Part(
                         inline_data=types.Blob(
-                            data=wav_bytes,
-                            mime_type="audio/wav"
+                            data=audio_bytes,
+                            mime_type=audio_mime
                         )
-                    ),
-                ]
+                    ))
 
                 # Include latest video frame if available
                 if latest_frame:
-                    try:
-                        frame_bytes = base64.b64decode(latest_frame)
-                        parts.append(types.Part(
-                            inline_data=types.Blob(
-                                data=frame_bytes,
-                                mime_type="image/jpeg"
-                            )
-                        ))
-                    except Exception:
-                        pass  # skip bad frame data
+                    parts.append(types.Part(
+                        inline_data=types.Blob(
+                            data=latest_frame,
+                            mime_type="image/jpeg"
+                        )
+                    ))
 
                 # Build prompt with cumulative context
-                prompt = "Analyze this 911 call audio clip and output triage JSON."
-                if previous_summary:
+                if frame_only:
+                    if previous_summary:
+                        parts.append(types.Part(text=f"Previous analysis: {previous_summary}\n\n{FRAME_ONLY_PROMPT}"))
+                    else:
+                        parts.append(FRAME_ONLY_PART)
+                elif previous_summary:
                     prompt = (
                         f"Previous analysis: {previous_summary}\n\n"
                         f"New audio segment (update #{analysis_count}). "
                         f"Update your triage based on this new audio. Output triage JSON."
                     )
-                if latest_frame:
-                    prompt += " A camera frame from the caller is also attached."
-
-                parts.append(types.Part(text=prompt))
+                    if latest_frame:
+                        prompt += FRAME_NOTE
+                    parts.append(types.Part(text=prompt))
+                else:
+                    parts.append(FIRST_ROUND_PARTS[bool(latest_frame)])
 
                 response = await client.aio.models.generate_content(
                     model=GEMINI_MODEL,
                     contents=parts,
-                    config=types.GenerateContentConfig(
-                        system_instruction=SYSTEM_PROMPT,
-                        temperature=0.1,
-                    )
+                    config=GEMINI_CONFIG,
                 )
-                text = response.text.strip() if response.text else ""
+                text = response.text or ""
                 logger.info(f"[{call_id}] Gemini response: {text[:200]}")
+                if not text:
+                    logger.warning(f"[{call_id}] Gemini returned an empty response")
+                    continue
 
-                # Extract JSON from response
-                start = text.find("{")
-                end = text.rfind("}") + 1
-                if start >= 0 and end > start:
-                    report = json.loads(text[start:end])
-                    # Save summary for next round
-                    previous_summary = report.get("situation_summary", previous_summary)
-                    dashboard_ws = dashboard_ws_getter(call_id)
-                    if dashboard_ws and not dashboard_ws.closed:
-                        await dashboard_ws.send_json({
-                            "type": "triage_update",
-                            "call_id": call_id,
-                            "report": report
-                        })
-                else:
-                    logger.warning(f"[{call_id}] Gemini returned no JSON: {text[:200]}")
+                report = orjson.loads(text)
+                # Save summary for next round
+                previous_summary = report.get("situation_summary", previous_summary)
+                _enqueue_dashboard(call.dashboard_ws, triage_prefix + text.encode() + b"}")
 
             except asyncio.CancelledError:
                 raise
             except Exception as e:
                 logger.error(f"[{call_id}] Gemini analysis error: {e}")
                 # Notify dashboard so it doesn't stay on "Waiting" forever
-                dashboard_ws = dashboard_ws_getter(call_id)
-                if dashboard_ws and not dashboard_ws.closed:
-                    await dashboard_ws.send_json({
-                        "type": "triage_update",
-                        "call_id": call_id,
-                        "report": {
-                            "situation_summary": f"AI analysis error — retrying... ({e.__class__.__name__})",
-                            "severity": 0,
-                            "caller_emotional_state": "unknown",
-                            "recommended_response_type": "unknown",
-                            "can_speak": True,
-                            "detected_keywords": []
-                        }
-                    })
+                report = {
+                    "situation_summary": f"AI analysis error — retrying... ({e.__class__.__name__})",
+                    **ERROR_REPORT_FIELDS,
+                }
+                _enqueue_dashboard(call.dashboard_ws, triage_prefix + orjson.dumps(report) + b"}")
 
     except asyncio.CancelledError:
         logger.info(f"[{call_id}] Gemini task cancelled")
@@ -302,8 +574,196 @@ async def gemini_session_task(call_id: str, audio_queue: asyncio.Queue, dashboar
 
 # ─── WebSocket Handlers ────────────────────────────────────────────────────────
 
+WS_MAX_MSG_SIZE = 2 * 1024 * 1024  # comfortably above one 0.5-quality camera JPEG
+WS_HEARTBEAT = 20.0  # seconds; detects dead sockets without waiting on TCP timeouts
+# A backlog of buffered frames is read without ever suspending, so audio readers
+# yield to the loop every this many PCM frames to keep signaling/dashboards responsive
+PCM_YIELD_EVERY = 32
+
+
+def new_websocket(heartbeat: float = WS_HEARTBEAT) -> web.WebSocketResponse:
+    """WebSocketResponse tuned for small JSON + PCM frames.
+
+    permessage-deflate buys nothing on already-compact payloads and costs CPU on every
+    frame, so it is never negotiated. aiohttp already sets TCP_NODELAY on accepted sockets.
+    """
+    return web.WebSocketResponse(compress=False, max_msg_size=WS_MAX_MSG_SIZE, heartbeat=heartbeat)
+
+
+async def on_signal_message(ws: web.WebSocketResponse, call_id: str, role: str, raw) -> None:
+    """Handle one signaling message (JSON text or bytes) from a caller or dispatcher socket."""
+    try:
+        data = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return
+
+    msg_type = data.get("type")
+
+    if msg_type == "call_initiated":
+        # Guard against duplicate call_id
+        if call_id in active_calls:
+            logger.warning(f"[{call_id}] Duplicate call_initiated, ignoring")
+            return
+
+        call = CallState(
+            caller_ws=ws,
+            audio_ring=PcmRing(PCM_RING_BYTES),
+            location=data.get("location", {}),
+            started_at=time.time(),
+            vitals_prefix=orjson.dumps({"type": "vitals", "call_id": call_id})[:-1] + b",",
+        )
+        active_calls[call_id] = call
+
+        # Replay any vitals that arrived before call was registered
+        buffered = pending_vitals.pop(call_id, None)
+        if buffered:
+            logger.info(f"[{call_id}] Replaying buffered vitals")
+            call.last_vitals = buffered
+
+        # Cluster into incident
+        location = call.location
+        incident_id, is_new = find_or_create_incident(call_id, location)
+        call.incident_id = incident_id
+        logger.info(f"[{call_id}] Incident {incident_id} (new={is_new}, reports={incidents[incident_id]['report_count']})")
+
+        # Notify all connected dispatchers
+        broadcast_to_dashboards({
+            "type": "incoming_call",
+            "call_id": call_id,
+            "location": location,
+            "incident_id": incident_id,
+            "report_count": incidents[incident_id]["report_count"],
+        })
+
+        # Broadcast community alert to idle subscribers
+        await broadcast_community_alert(incident_id)
+
+    elif msg_type == "call_ended":
+        await cleanup_call(call_id)
+
+    else:
+        # WebRTC SDP/ICE — forward to the other party
+        call = active_calls.get(call_id)
+        if not call:
+            return
+        if role == "caller":
+            # Already valid JSON — queue the caller's bytes as-is rather than re-dumping the dict
+            _enqueue_dashboard(call.dashboard_ws, raw.encode() if isinstance(raw, str) else bytes(raw))
+        else:
+            target = call.caller_ws
+            if target and not target.closed:
+                await target.send_str(raw)
+
+
+class AudioIngest:
+    """Per-socket PCM/JPEG intake for one call.
+
+    iOS may open its audio stream before call_initiated lands, so the call is
+    bound lazily, and re-bound if it is cleaned up or its call_id re-registered.
+    """
+    __slots__ = (
+        "call_id", "call", "swap", "channels", "rate", "convert", "ratecv_state", "last_overflow_log", "carry",
+    )
+
+    def __init__(self, call_id: str, query) -> None:
+        # Optional input format; the defaults match the iOS tap and skip conversion
+        self.call_id = call_id
+        byteorder = query.get("byteorder", "little")
+        self.channels = int(query.get("channels", 1))
+        self.rate = int(query.get("rate", AUDIO_SAMPLE_RATE))
+        # normalize_pcm only downmixes stereo; reject anything else before the first frame
+        if byteorder not in ("little", "big") or self.channels not in (1, 2) or self.rate <= 0:
+            raise ValueError(
+                f"unsupported audio format: byteorder={byteorder} channels={self.channels} rate={self.rate}"
+            )
+        self.swap = byteorder != sys.byteorder
+        self.convert = self.swap or self.channels != 1 or self.rate != AUDIO_SAMPLE_RATE
+        self.ratecv_state = None
+        self.last_overflow_log = 0.0
+        self.carry = b""  # partial sample frame held back until the next frame completes it
+        self.call: Optional[CallState] = active_calls.get(call_id)
+
+    def bind(self) -> Optional[CallState]:
+        call = self.call
+        if call is not None and not call.audio_ring.closed and active_calls.get(self.call_id) is call:
+            return call
+        current = active_calls.get(self.call_id)
+        if current is not call:
+            # New call: resampler state and any partial sample belonged to the old stream
+            self.call = current
+            self.ratecv_state = None
+            self.carry = b""
+        return current
+
+    def push_pcm(self, pcm) -> None:
+        call = self.bind()
+        if call is None:
+            return
+        # Clients may split the byte stream mid-sample: hold a trailing partial sample
+        # back for the next frame, so the ring (and the Opus encoder) only sees whole samples
+        if self.carry:
+            pcm = self.carry + pcm
+            self.carry = b""
+        partial = len(pcm) % (AUDIO_BYTES_PER_SAMPLE * self.channels)
+        if partial:
+            self.carry = bytes(pcm[-partial:])
+            pcm = memoryview(pcm)[:-partial]
+            if not pcm:
+                return
+        if self.convert:
+            try:
+                pcm, self.ratecv_state = normalize_pcm(pcm, self.swap, self.channels, self.rate, self.ratecv_state)
+            except (ValueError, audioop.error):
+                logger.warning(f"[{self.call_id}] Dropping malformed PCM frame ({len(pcm)} bytes)")
+                return
+        ring = call.audio_ring
+        ring.write(pcm)
+        if ring.dropped:
+            # Gemini is behind and the ring wrapped — say so, but not once per frame
+            now = time.monotonic()
+            if now - self.last_overflow_log >= OVERFLOW_LOG_INTERVAL:
+                logger.warning(f"[{self.call_id}] PCM ring full, dropped {ring.dropped} bytes of stale audio")
+                ring.dropped = 0
+                self.last_overflow_log = now
+
+    def set_frame(self, jpeg: bytes) -> None:
+        call = self.bind()
+        if call is not None:
+            call.latest_frame = jpeg  # latest wins; read at flush time
+
+
+# Buffer vitals that arrive before call_initiated registers the call
+pending_vitals: dict[str, dict] = {}
+
+
+def on_vitals_message(call_id: str, raw) -> None:
+    """Cache one vitals reading on its call and forward it, or buffer it until the call exists."""
+    try:
+        vitals = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return
+    if not isinstance(vitals, dict):
+        return
+    # iOS tags readings with type/call_id; the prebuilt vitals prefix already carries both
+    vitals.pop("type", None)
+    vitals.pop("call_id", None)
+
+    call = active_calls.get(call_id)
+    if not call:
+        # Call not registered yet — buffer so it can be replayed later
+        logger.info(f"[{call_id}] Vitals arrived before call registered, buffering")
+        pending_vitals[call_id] = vitals
+        return
+
+    logger.info(f"[{call_id}] Vitals received: HR={vitals.get('hr')} BR={vitals.get('breathing')}")
+    call.last_vitals = vitals
+
+    # Forward to dashboard if already connected
+    _enqueue_dashboard(call.dashboard_ws, vitals_payload(call.vitals_prefix, vitals))
+
+
 async def handle_signal(request: web.Request) -> web.WebSocketResponse:
-    ws = web.WebSocketResponse()
+    ws = new_websocket()
     await ws.prepare(request)
 
     call_id = request.query.get("call_id")
@@ -316,74 +776,8 @@ async def handle_signal(request: web.Request) -> web.WebSocketResponse:
     logger.info(f"[{call_id}] Signal connected: {role}")
 
     async for msg in ws:
-        if msg.type != aiohttp.WSMsgType.TEXT:
-            continue
-
-        try:
-            data = json.loads(msg.data)
-        except json.JSONDecodeError:
-            continue
-
-        msg_type = data.get("type")
-
-        if msg_type == "call_initiated":
-            # Guard against duplicate call_id
-            if call_id in active_calls:
-                logger.warning(f"[{call_id}] Duplicate call_initiated, ignoring")
-                continue
-
-            audio_queue: asyncio.Queue = asyncio.Queue(maxsize=500)
-            active_calls[call_id] = {
-                "caller_ws": ws,
-                "dispatcher_ws": None,
-                "dashboard_ws": None,
-                "audio_queue": audio_queue,
-                "gemini_task": None,
-                "location": data.get("location", {}),
-                "started_at": time.time(),
-                "last_vitals": None,
-            }
-
-            # Replay any vitals that arrived before call was registered
-            buffered = pending_vitals.pop(call_id, None)
-            if buffered:
-                logger.info(f"[{call_id}] Replaying buffered vitals")
-                active_calls[call_id]["last_vitals"] = buffered
-
-            # Cluster into incident
-            location = data.get("location", {})
-            incident_id, is_new = find_or_create_incident(call_id, location)
-            active_calls[call_id]["incident_id"] = incident_id
-            logger.info(f"[{call_id}] Incident {incident_id} (new={is_new}, reports={incidents[incident_id]['report_count']})")
-
-            # Notify all connected dispatchers
-            for dash_ws in dispatcher_connections.copy():
-                if not dash_ws.closed:
-                    await dash_ws.send_json({
-                        "type": "incoming_call",
-                        "call_id": call_id,
-                        "location": location,
-                        "incident_id": incident_id,
-                        "report_count": incidents[incident_id]["report_count"],
-                    })
-
-            # Broadcast community alert to idle subscribers
-            await broadcast_community_alert(incident_id)
-
-        elif msg_type == "call_ended":
-            await cleanup_call(call_id)
-
-        else:
-            # WebRTC SDP/ICE — forward to the other party
-            call = active_calls.get(call_id)
-            if not call:
-                continue
-            if role == "caller":
-                target = call.get("dashboard_ws")
-            else:
-                target = call.get("caller_ws")
-            if target and not target.closed:
-                await target.send_str(msg.data)
+        if msg.type == aiohttp.WSMsgType.TEXT:
+            await on_signal_message(ws, call_id, role, msg.data)
 
     # WebSocket closed — treat as call end if this was the caller
     if role == "caller" and call_id in active_calls:
@@ -393,131 +787,149 @@ async def handle_signal(request: web.Request) -> web.WebSocketResponse:
 
 
 async def handle_audio(request: web.Request) -> web.WebSocketResponse:
-    ws = web.WebSocketResponse()
+    ws = new_websocket()
     await ws.prepare(request)
 
-    call_id = request.query.get("call_id")
+    try:
+        ingest = AudioIngest(request.query.get("call_id"), request.query)
+    except ValueError:
+        await ws.close()
+        return ws
 
+    frames = 0
     async for msg in ws:
-        call = active_calls.get(call_id)
-        if not call:
+        # Binary only — no TEXT frames (and their UTF-8 validation) on the audio path.
+        # 1-byte tag, then raw payload: PCM audio or a JPEG camera frame
+        if msg.type != aiohttp.WSMsgType.BINARY or not msg.data:
             continue
-
-        queue = call.get("audio_queue")
-        if not queue:
-            continue
-
-        if msg.type == aiohttp.WSMsgType.BINARY:
-            await queue.put({"type": "audio", "data": msg.data})
-
-        elif msg.type == aiohttp.WSMsgType.TEXT:
-            try:
-                data = json.loads(msg.data)
-                if data.get("type") == "frame":
-                    await queue.put({"type": "frame", "data": data["data"]})
-            except json.JSONDecodeError:
-                pass
+        tag = msg.data[0]
+        if tag == AUDIO_TAG_PCM:
+            ingest.push_pcm(memoryview(msg.data)[1:])
+            frames += 1
+            if not frames % PCM_YIELD_EVERY:
+                await asyncio.sleep(0)
+        elif tag == AUDIO_TAG_JPEG:
+            ingest.set_frame(msg.data[1:])
 
     return ws
 
 
-# Buffer vitals that arrive before call_initiated registers the call
-pending_vitals: dict[str, dict] = {}
-
-
 async def handle_vitals(request: web.Request) -> web.WebSocketResponse:
-    ws = web.WebSocketResponse()
+    ws = new_websocket()
     await ws.prepare(request)
 
     call_id = request.query.get("call_id")
 
     async for msg in ws:
-        if msg.type != aiohttp.WSMsgType.TEXT:
-            continue
+        if msg.type == aiohttp.WSMsgType.TEXT:
+            on_vitals_message(call_id, msg.data)
 
-        try:
-            vitals = json.loads(msg.data)
-        except json.JSONDecodeError:
-            continue
+    return ws
 
-        call = active_calls.get(call_id)
-        if not call:
-            # Call not registered yet — buffer so it can be replayed later
-            logger.info(f"[{call_id}] Vitals arrived before call registered, buffering")
-            pending_vitals[call_id] = vitals
-            continue
 
-        logger.info(f"[{call_id}] Vitals received: HR={vitals.get('hr')} BR={vitals.get('breathing')}")
-        call["last_vitals"] = vitals
+async def handle_caller(request: web.Request) -> web.WebSocketResponse:
+    """Multiplexed caller socket: signal, audio, vitals and frames on one connection.
+
+    Every inbound message is BINARY with a 1-byte MUX_TAG_* stream id. Messages
+    from the server back to the caller are plain JSON, as on /ws/signal.
+    """
+    ws = new_websocket()
+    await ws.prepare(request)
+
+    call_id = request.query.get("call_id")
+    if not call_id:
+        await ws.close()
+        return ws
+    try:
+        ingest = AudioIngest(call_id, request.query)
+    except ValueError:
+        await ws.close()
+        return ws
+
+    logger.info(f"[{call_id}] Multiplexed caller connected")
 
-        # Forward to dashboard if already connected
-        dashboard_ws = call.get("dashboard_ws")
-        if dashboard_ws and not dashboard_ws.closed:
-            await dashboard_ws.send_json({
-                "type": "vitals",
-                "call_id": call_id,
-                **vitals
-            })
+    frames = 0
+    async for msg in ws:
+        if msg.type != aiohttp.WSMsgType.BINARY or not msg.data:
+            continue
+        tag = msg.data[0]
+        if tag == MUX_TAG_AUDIO:
+            ingest.push_pcm(memoryview(msg.data)[1:])
+            frames += 1
+            if not frames % PCM_YIELD_EVERY:
+                await asyncio.sleep(0)
+        elif tag == MUX_TAG_FRAME:
+            ingest.set_frame(msg.data[1:])
+        elif tag == MUX_TAG_VITALS:
+            on_vitals_message(call_id, memoryview(msg.data)[1:])
+        elif tag == MUX_TAG_SIGNAL:
+            await on_signal_message(ws, call_id, "caller", memoryview(msg.data)[1:])
+
+    # WebSocket closed — treat as call end
+    if call_id in active_calls:
+        await cleanup_call(call_id)
 
     return ws
 
 
 async def handle_dashboard(request: web.Request) -> web.WebSocketResponse:
-    ws = web.WebSocketResponse()
+    ws = new_websocket()
     await ws.prepare(request)
 
-    dispatcher_connections.add(ws)
+    outbox: asyncio.Queue = asyncio.Queue()
+    dashboard_outboxes[ws] = outbox
+    writer = asyncio.create_task(dashboard_writer(ws, outbox))
+    _add_dispatcher(ws)
     logger.info("Dashboard connected")
 
-    async for msg in ws:
-        if msg.type != aiohttp.WSMsgType.TEXT:
-            continue
-        try:
-            data = json.loads(msg.data)
-        except json.JSONDecodeError:
-            continue
+    try:
+        async for msg in ws:
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                continue
+            try:
+                data = orjson.loads(msg.data)
+            except orjson.JSONDecodeError:
+                continue
+            if not isinstance(data, dict):
+                continue
 
-        call_id = data.get("call_id")
-        msg_type = data.get("type")
-
-        if msg_type == "dispatcher_joined":
-            call = active_calls.get(call_id)
-            if call:
-                call["dashboard_ws"] = ws
-
-                # Start Gemini session now — not at call_initiated — to avoid
-                # burning RPD quota while waiting for a dispatcher to answer.
-                if call["gemini_task"] is None:
-                    task = asyncio.create_task(
-                        gemini_session_task(
-                            call_id,
-                            call["audio_queue"],
-                            lambda cid: active_calls.get(cid, {}).get("dashboard_ws")
-                        )
-                    )
-                    call["gemini_task"] = task
+            call_id = data.get("call_id")
+            msg_type = data.get("type")
 
-                # Replay cached vitals so dispatcher sees them immediately on answer
-                last_vitals = call.get("last_vitals")
-                if last_vitals:
-                    await ws.send_json({"type": "vitals", "call_id": call_id, **last_vitals})
+            if msg_type == "dispatcher_joined":
+                call = active_calls.get(call_id)
+                if call:
+                    call.dashboard_ws = ws
 
-                caller_ws = call.get("caller_ws")
-                if caller_ws and not caller_ws.closed:
-                    await caller_ws.send_json({"type": "dispatcher_ready", "call_id": call_id})
+                    # Start Gemini session now — not at call_initiated — to avoid
+                    # burning RPD quota while waiting for a dispatcher to answer.
+                    if call.gemini_task is None:
+                        call.gemini_task = asyncio.create_task(gemini_session_task(call_id, call))
 
-        elif msg_type == "call_ended":
-            await cleanup_call(call_id)
+                    # Replay cached vitals so dispatcher sees them immediately on answer
+                    last_vitals = call.last_vitals
+                    if last_vitals:
+                        _enqueue_dashboard(ws, vitals_payload(call.vitals_prefix, last_vitals))
 
-        else:
-            # WebRTC SDP/ICE from dispatcher → forward to caller
-            call = active_calls.get(call_id)
-            if call:
-                caller_ws = call.get("caller_ws")
-                if caller_ws and not caller_ws.closed:
-                    await caller_ws.send_str(msg.data)
+                    caller_ws = call.caller_ws
+                    if caller_ws and not caller_ws.closed:
+                        await _send(caller_ws, {"type": "dispatcher_ready", "call_id": call_id})
 
-    dispatcher_connections.discard(ws)
+            elif msg_type == "call_ended":
+                await cleanup_call(call_id)
+
+            else:
+                # WebRTC SDP/ICE from dispatcher → forward to caller
+                call = active_calls.get(call_id)
+                if call:
+                    caller_ws = call.caller_ws
+                    if caller_ws and not caller_ws.closed:
+                        await caller_ws.send_str(msg.data)
+    finally:
+        # Runs on any exit, so a failing handler can't leak the writer task or outbox
+        _remove_dispatcher(ws)
+        dashboard_outboxes.pop(ws, None)
+        writer.cancel()
     logger.info("Dashboard disconnected")
     return ws
 
@@ -532,50 +944,48 @@ async def cleanup_call(call_id: str, reason: str = "ended"):
     logger.info(f"[{call_id}] Cleaning up: {reason}")
 
     # Stop Gemini
-    task = call.get("gemini_task")
+    task = call.gemini_task
     if task and not task.done():
-        queue = call.get("audio_queue")
-        if queue:
-            await queue.put(None)  # Sentinel
+        call.audio_ring.close()
         task.cancel()
-        try:
-            await task
-        except asyncio.CancelledError:
-            pass
+        # Bounded wait: a round stuck in a Gemini request must not hold up cleanup.
+        # asyncio.wait (unlike wait_for) never re-cancels or blocks past the timeout.
+        _, pending = await asyncio.wait({task}, timeout=GEMINI_CANCEL_TIMEOUT)
+        if pending:
+            logger.warning(f"[{call_id}] Gemini task still winding down after {GEMINI_CANCEL_TIMEOUT}s, not waiting")
+
+    notifications = []
 
     # Update incident — remove this call, close incident if last call
-    incident_id = call.get("incident_id")
+    incident_id = call.incident_id
     if incident_id and incident_id in incidents:
         inc = incidents[incident_id]
         inc["call_ids"].discard(call_id)
         if not inc["call_ids"]:
             incidents.pop(incident_id)
             logger.info(f"Incident {incident_id} closed (no remaining calls)")
-            for dash_ws in dispatcher_connections.copy():
-                if not dash_ws.closed:
-                    try:
-                        await dash_ws.send_json({"type": "incident_closed", "incident_id": incident_id})
-                    except Exception:
-                        pass
+            broadcast_to_dashboards({"type": "incident_closed", "incident_id": incident_id})
         else:
             inc["report_count"] = len(inc["call_ids"])
-            await broadcast_community_alert(incident_id)
-
-    # Notify dashboard
-    dashboard_ws = call.get("dashboard_ws")
-    if dashboard_ws and not dashboard_ws.closed:
-        await dashboard_ws.send_json({"type": "call_ended", "call_id": call_id, "reason": reason})
+            notifications.append(broadcast_community_alert(incident_id))
 
-    # Notify caller
-    caller_ws = call.get("caller_ws")
+    # Notify dashboard and caller with one serialized payload
+    payload = orjson.dumps({"type": "call_ended", "call_id": call_id, "reason": reason})
+    _enqueue_dashboard(call.dashboard_ws, payload)
+    caller_ws = call.caller_ws
     if caller_ws and not caller_ws.closed:
-        await caller_ws.send_json({"type": "call_ended", "call_id": call_id, "reason": reason})
+        notifications.append(caller_ws.send_bytes(payload))
+
+    # Caller send and community re-alert fan-out run concurrently, not back to back
+    for result in await asyncio.gather(*notifications, return_exceptions=True):
+        if isinstance(result, Exception):
+            logger.warning(f"[{call_id}] Cleanup notification failed: {result!r}")
 
 
 # ─── Community Alert Subscriber ───────────────────────────────────────────────
 
 async def handle_alerts(request: web.Request) -> web.WebSocketResponse:
-    ws = web.WebSocketResponse(heartbeat=30)
+    ws = new_websocket(heartbeat=30)
     await ws.prepare(request)
 
     alert_subscribers.add(ws)
@@ -592,7 +1002,7 @@ async def handle_alerts(request: web.Request) -> web.WebSocketResponse:
             "alerted_count": inc["alerted_count"],
         })
     if active:
-        await ws.send_json({"type": "active_incidents", "incidents": active})
+        await _send(ws, {"type": "active_incidents", "incidents": active})
 
     # Keep connection alive — no inbound messages expected
     async for msg in ws:
@@ -628,6 +1038,7 @@ async def handle_turn_credentials(request: web.Request) -> web.Response:
 
 def create_app() -> web.Application:
     app = web.Application()
+    app.router.add_get("/ws", handle_caller)
     app.router.add_get("/ws/signal", handle_signal)
     app.router.add_get("/ws/audio", handle_audio)
     app.router.add_get("/ws/vitals", handle_vitals)
@@ -653,4 +1064,22 @@ if __name__ == "__main__":
     else:
         logger.info(f"Starting without TLS on port {port} (local dev)")
 
-    web.run_app(create_app(), port=port, ssl_context=ssl_context)
+    # uvloop's libuv transports cut per-read/write overhead on the WebSocket
+    # hot paths; fall back to the stock asyncio loop where it isn't available.
+    # The loop is handed to run_app directly: uvloop.install() goes through the
+    # event loop policy API, which is deprecated from Python 3.12.
+    loop = None
+    try:
+        import uvloop
+        loop = uvloop.new_event_loop()
+        logger.info("Using uvloop event loop")
+    except ImportError:
+        logger.info("uvloop not installed, using default asyncio event loop")
+
+    # Build the shared Gemini client up front so the first answered call doesn't pay for it
+    if os.environ.get("GEMINI_API_KEY"):
+        get_gemini_client()
+    else:
+        logger.warning("GEMINI_API_KEY not set — AI triage will fail until it is configured")
+
+    web.run_app(create_app(), port=port, ssl_context=ssl_context, loop=loop)
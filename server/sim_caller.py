@@ -9,6 +9,7 @@ Usage:
     python sim_caller.py                         # default: localhost, Chapel Hill coords
     python sim_caller.py --host visual911.mooo.com --lat 35.9132 --lng -79.0558
     python sim_caller.py --ssl                   # use wss://
+    python sim_caller.py --mux                   # single multiplexed /ws connection
 """
 
 import argparse
@@ -33,10 +34,19 @@ async def alerts_subscriber(host: str, port: int, ssl: bool, stop_event: asyncio
         print(f"Alerts subscriber error: {e}")
 
 
-async def run(host: str, port: int, lat: float, lng: float, duration: int, ssl: bool):
+async def send_signal(ws: aiohttp.ClientWebSocketResponse, message: dict, mux: bool):
+    """Send a signaling message, tagged with the signal stream id on the multiplexed socket."""
+    if mux:
+        await ws.send_bytes(b"\x00" + json.dumps(message).encode())
+    else:
+        await ws.send_json(message)
+
+
+async def run(host: str, port: int, lat: float, lng: float, duration: int, ssl: bool, mux: bool = False):
     scheme = "wss" if ssl else "ws"
     call_id = str(uuid.uuid4())
-    url = f"{scheme}://{host}:{port}/ws/signal?call_id={call_id}&role=caller"
+    path = f"/ws?call_id={call_id}" if mux else f"/ws/signal?call_id={call_id}&role=caller"
+    url = f"{scheme}://{host}:{port}{path}"
     ssl_ctx = None if not ssl else True
 
     print(f"Connecting to {url}")
@@ -52,25 +62,25 @@ async def run(host: str, port: int, lat: float, lng: float, duration: int, ssl:
     async with aiohttp.ClientSession() as session:
         async with session.ws_connect(url, ssl=ssl_ctx) as ws:
             # Initiate call
-            await ws.send_json({
+            await send_signal(ws, {
                 "type": "call_initiated",
                 "call_id": call_id,
                 "location": {"lat": lat, "lng": lng},
-            })
+            }, mux)
             print(f"call_initiated sent — waiting {duration}s before ending")
 
             # Listen for messages while waiting
             try:
                 async with asyncio.timeout(duration):
                     async for msg in ws:
-                        if msg.type == aiohttp.WSMsgType.TEXT:
+                        if msg.type in (aiohttp.WSMsgType.TEXT, aiohttp.WSMsgType.BINARY):
                             data = json.loads(msg.data)
                             print(f"  <- {data.get('type', 'unknown')}: {msg.data[:120]}")
             except TimeoutError:
                 pass
 
             # End call
-            await ws.send_json({"type": "call_ended", "call_id": call_id})
+            await send_signal(ws, {"type": "call_ended", "call_id": call_id}, mux)
             print("call_ended sent")
 
     stop_alerts.set()
@@ -85,9 +95,16 @@ def main():
     parser.add_argument("--lng", type=float, default=-79.0558, help="Longitude")
     parser.add_argument("--duration", type=int, default=30, help="Seconds before ending call")
     parser.add_argument("--ssl", action="store_true", help="Use wss:// instead of ws://")
+    parser.add_argument("--mux", action="store_true", help="Use the multiplexed /ws endpoint")
     args = parser.parse_args()
 
-    asyncio.run(run(args.host, args.port, args.lat, args.lng, args.duration, args.ssl))
+    # Same event loop as the server when available, so load tests see its behavior
+    try:
+        import uvloop
+        run_loop = uvloop.run
+    except ImportError:
+        run_loop = asyncio.run
+    run_loop(run(args.host, args.port, args.lat, args.lng, args.duration, args.ssl, args.mux))
 
 
 if __name__ == "__main__":
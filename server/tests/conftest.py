@@ -1,11 +1,62 @@
+import asyncio
 import os
 import sys
 import pytest
+import pytest_asyncio
+from aiohttp import ClientSession, web
 
 # Ensure server module is importable
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from server import create_app, active_calls, dispatcher_connections
+import server
+from server import create_app, active_calls, dispatcher_connections, incidents, alert_subscribers
+
+
+def pytest_asyncio_loop_factories(config, item):
+    """Run the tests on uvloop, as the server does in production, when it is installed."""
+    try:
+        import uvloop
+    except ImportError:
+        return {"asyncio": asyncio.new_event_loop}
+    return {"uvloop": uvloop.new_event_loop}
+
+
+@pytest.fixture(scope="module")
+def app():
+    """The aiohttp app under test, built once per module."""
+    return create_app()
+
+
+@pytest_asyncio.fixture(scope="module", loop_scope="module")
+async def client(app):
+    """A ClientSession bound to the app served on a real loopback TCPSite, shared by the module.
+
+    Paths are relative to the site, so tests call client.ws_connect("/ws/signal?...").
+    """
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    async with ClientSession(base_url=f"http://{host}:{port}") as session:
+        yield session
+    await runner.cleanup()
+
+
+async def _noop_gemini_session_task(call_id, call):
+    """No-op replacement for gemini_session_task in tests."""
+    pass
+
+
+@pytest.fixture(scope="session", autouse=True)
+def noop_gemini():
+    """Keep dispatcher_joined from starting real Gemini rounds, installed once per session.
+
+    Unit tests that exercise gemini_session_task import it directly, so they still get the real one.
+    """
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(server, "gemini_session_task", _noop_gemini_session_task)
+        yield
 
 
 @pytest.fixture(autouse=True)
@@ -13,6 +64,12 @@ def clean_state():
     """Reset global state between tests."""
     active_calls.clear()
     dispatcher_connections.clear()
+    server._dispatchers_snapshot = ()
+    incidents.clear()
+    alert_subscribers.clear()
     yield
     active_calls.clear()
     dispatcher_connections.clear()
+    server._dispatchers_snapshot = ()
+    incidents.clear()
+    alert_subscribers.clear()
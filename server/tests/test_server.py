@@ -1,28 +1,130 @@
+import array
 import asyncio
-import json
-import os
-import sys
+import io
+import logging
 import time
+import uuid
+import wave
+from collections import defaultdict, deque
 
+import orjson
 import pytest
-from unittest.mock import AsyncMock, MagicMock, patch
+import pytest_asyncio
+from unittest.mock import AsyncMock, MagicMock
 from aiohttp import web, WSMsgType
 
-# Import from server
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from server import create_app, active_calls, dispatcher_connections, cleanup_call
+from server import (
+    incidents, active_calls, dispatcher_connections, dashboard_outboxes, alert_subscribers, cleanup_call,
+    send_to_dashboard, pcm_to_wav, is_silent,
+    AudioIngest, CallState, PcmRing, OVERFLOW_LOG_INTERVAL, gemini_session_task, pcm_to_ogg_opus, vitals_payload, on_vitals_message,
+    _add_dispatcher,
+)
 
+_PCM = b"\x00\x01\x02\x03" * 100  # 200 16-bit samples, shared by the audio tests
 
-async def _noop_gemini_session_task(call_id, audio_queue, dashboard_ws_getter):
-    """No-op replacement for gemini_session_task in tests."""
-    pass
+# Pre-serialized templates for the messages setup_call sends for every call (test call ids are plain ASCII)
+_CALL_INITIATED = '{"type":"call_initiated","call_id":"%s","location":%s}'
+_DEFAULT_LOCATION = orjson.dumps({"lat": 0, "lng": 0}).decode()
+_DISPATCHER_JOINED = '{"type":"dispatcher_joined","call_id":"%s"}'
+
+
+def send_message(ws, message: dict | str):
+    """Send a JSON text frame, encoded with orjson like the server's own messages; str is sent as-is."""
+    return ws.send_str(message if isinstance(message, str) else orjson.dumps(message).decode())
+
+
+async def receive_message(ws) -> dict:
+    """Next JSON message on a socket, whether it arrived as a text or binary frame."""
+    msg = await ws.receive()
+    assert msg.type in (WSMsgType.TEXT, WSMsgType.BINARY), msg
+    return orjson.loads(msg.data)
+
+
+_dashboard_backlog: dict = defaultdict(deque)
+
+
+async def receive_dashboard(ws) -> dict:
+    """Next message on a dashboard socket — the server batches them into JSON arrays."""
+    backlog = _dashboard_backlog[ws]
+    if not backlog:
+        backlog.extend(await receive_message(ws))
+    return backlog.popleft()
+
+
+async def wait_for(predicate, timeout: float = 1.0, interval: float = 0.001) -> None:
+    """Poll predicate() on the event loop until it holds, failing after `timeout` seconds."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        if loop.time() > deadline:
+            raise TimeoutError(f"condition not met within {timeout}s")
+        await asyncio.sleep(interval)
+
+
+async def exchange(ws, message: dict | str, reply):
+    """Send message with `reply`, the receive coroutine for its response, already waiting."""
+    task = asyncio.create_task(reply)
+    await send_message(ws, message)
+    return await task
+
+
+async def setup_call(client, call_id, location=None, with_dashboard=False, with_dispatcher=False, dash_ws=None):
+    """Register call_id over a caller signal socket; returns (caller_ws, dash_ws).
+
+    With a dashboard (a new one, or dash_ws if given), its incoming_call and incident_update are
+    consumed before returning; with_dispatcher also joins the call and consumes dispatcher_ready.
+    """
+    if dash_ws is None and (with_dashboard or with_dispatcher):
+        dash_ws = await client.ws_connect("/ws/dashboard")
+        await wait_for(lambda: dispatcher_connections)
+
+    caller_ws = await client.ws_connect(f"/ws/signal?call_id={call_id}&role=caller")
+    encoded_location = orjson.dumps(location).decode() if location is not None else _DEFAULT_LOCATION
+    await send_message(caller_ws, _CALL_INITIATED % (call_id, encoded_location))
+    if dash_ws is None:
+        await wait_for(lambda: call_id in active_calls)
+        return caller_ws, None
+
+    assert (await receive_dashboard(dash_ws))["type"] == "incoming_call"
+    assert (await receive_dashboard(dash_ws))["type"] == "incident_update"
+    if with_dispatcher:
+        joined = _DISPATCHER_JOINED % call_id
+        assert (await exchange(dash_ws, joined, receive_message(caller_ws)))["type"] == "dispatcher_ready"
+    return caller_ws, dash_ws
+
+
+@pytest_asyncio.fixture(scope="module", loop_scope="module")
+async def shared_dashboard(client):
+    """One dashboard socket reused by every joined_call test: (client-side ws, server-side ws)."""
+    ws = await client.ws_connect("/ws/dashboard")
+    await wait_for(lambda: len(dispatcher_connections) == 1)
+    server_ws = next(iter(dispatcher_connections))
+    yield ws, server_ws
+    await ws.close()
+
+
+@pytest_asyncio.fixture
+async def joined_call(client, shared_dashboard):
+    """A registered call the shared dashboard has already joined: (call_id, caller_ws, dash_ws)."""
+    dash_ws, server_dash = shared_dashboard
+    _add_dispatcher(server_dash)  # clean_state dropped it after the previous test
+    call_id = f"joined-{uuid.uuid4().hex[:8]}"
+    caller_ws, _ = await setup_call(client, call_id, with_dispatcher=True, dash_ws=dash_ws)
+    yield call_id, caller_ws, dash_ws
+
+    # End the call here, consuming its messages, so none leak into the next test's dashboard reads
+    if call_id in active_calls:
+        await cleanup_call(call_id)
+        async with asyncio.timeout(1.0):
+            while (await receive_dashboard(dash_ws))["type"] != "call_ended":
+                pass
+    await caller_ws.close()
 
 
 # ─── Test 1: App Creation ─────────────────────────────────────────────────────
 
-async def test_create_app_returns_valid_app():
+def test_create_app_returns_valid_app(app):
     """create_app() returns an aiohttp app with all expected routes."""
-    app = create_app()
     assert isinstance(app, web.Application)
 
     route_paths = {r.resource.canonical for r in app.router.routes() if hasattr(r, "resource") and r.resource}
@@ -32,47 +134,203 @@ async def test_create_app_returns_valid_app():
     assert "/ws/dashboard" in route_paths
 
 
+# ─── Test 1b: WAV wrapping ────────────────────────────────────────────────────
+
+@pytest.mark.parametrize("sample_rate,channels,sample_width", [(16000, 1, 2), (48000, 2, 2)])
+def test_pcm_to_wav_readable(sample_rate, channels, sample_width):
+    """pcm_to_wav() output is a valid WAV file carrying the original PCM."""
+    pcm = bytes(range(256)) * 8
+    wav_bytes = pcm_to_wav(pcm, sample_rate, channels, sample_width)
+    assert len(wav_bytes) == 44 + len(pcm)
+
+    with wave.open(io.BytesIO(wav_bytes), "rb") as wf:
+        assert wf.getframerate() == sample_rate
+        assert wf.getnchannels() == channels
+        assert wf.getsampwidth() == sample_width
+        assert wf.readframes(wf.getnframes()) == pcm
+
+
+def test_pcm_to_ogg_opus_decodes():
+    """pcm_to_ogg_opus() output is an Ogg/Opus stream covering the full clip."""
+    av = pytest.importorskip("av")
+    pcm = b"\x00\x10\x00\xf0" * 8000  # 1s of 16kHz mono
+    ogg = pcm_to_ogg_opus(pcm)
+    assert ogg[:4] == b"OggS"
+    assert len(ogg) < len(pcm) // 4
+
+    with av.open(io.BytesIO(ogg)) as container:
+        stream = container.streams.audio[0]
+        assert stream.codec_context.name == "opus"
+        decoded = sum(frame.samples for frame in container.decode(stream)) / stream.rate
+    assert decoded == pytest.approx(1.0, abs=0.05)
+
+
+# ─── Test 1c: Gemini analysis round ───────────────────────────────────────────
+
+@pytest.fixture
+def gemini_round(monkeypatch):
+    """Factory for gemini_session_task runs against a mocked client: returns (gemini, sent, call, run).
+
+    `result` is what generate_content returns, or an exception for it to raise. `sent` collects
+    the decoded dashboard payloads, and `await run(until)` runs rounds until the predicate holds.
+    """
+    monkeypatch.setattr("server.ANALYSIS_INTERVAL", 0.05)
+
+    def make(result=None, pcm=b"\x00\x01" * 1600, call_id="test-call-gemini"):
+        gemini = MagicMock()
+        if isinstance(result, BaseException):
+            gemini.aio.models.generate_content = AsyncMock(side_effect=result)
+        else:
+            gemini.aio.models.generate_content = AsyncMock(return_value=result)
+        sent = []
+        monkeypatch.setattr("server.get_gemini_client", lambda: gemini)
+        monkeypatch.setattr("server._enqueue_dashboard", lambda ws, payload: sent.append(orjson.loads(payload)))
+
+        ring = PcmRing(6400)
+        ring.write(pcm)
+        call = CallState(caller_ws=None, audio_ring=ring, location={}, started_at=0.0)
+
+        async def run(until):
+            task = asyncio.create_task(gemini_session_task(call_id, call))
+            await wait_for(until)
+            ring.close()
+            await task
+
+        return gemini, sent, call, run
+
+    return make
+
+
+async def test_gemini_session_task_forwards_triage(gemini_round):
+    """A round sends the buffered audio to Gemini and relays the report to the dashboard."""
+    response = MagicMock(text='{"situation_summary": "Caller fell", "severity": 3}')
+    gemini, sent, _, run = gemini_round(response)
+    await run(until=lambda: sent)
+
+    request = gemini.aio.models.generate_content.call_args.kwargs
+    assert request["contents"][0].inline_data.mime_type in ("audio/ogg", "audio/wav")
+    assert request["config"].response_mime_type == "application/json"
+    assert request["contents"][-1].text.startswith("Analyze this 911 call audio clip")
+    assert sent == [{
+        "type": "triage_update",
+        "call_id": "test-call-gemini",
+        "report": {"situation_summary": "Caller fell", "severity": 3},
+    }]
+
+
+async def test_gemini_session_task_reports_errors(gemini_round):
+    """A failed round sends a placeholder triage_update instead of leaving the dashboard waiting."""
+    _, sent, _, run = gemini_round(RuntimeError("boom"), call_id="test-call-error")
+    await run(until=lambda: sent)
+
+    assert len(sent) == 1
+    assert sent[0]["type"] == "triage_update"
+    assert sent[0]["call_id"] == "test-call-error"
+    assert sent[0]["report"]["severity"] == 0
+    assert "RuntimeError" in sent[0]["report"]["situation_summary"]
+    assert set(sent[0]["report"]) == {
+        "situation_summary", "severity", "caller_emotional_state",
+        "recommended_response_type", "can_speak", "detected_keywords",
+    }
+
+
+async def test_gemini_session_task_skips_silence(gemini_round):
+    """Rounds whose audio is below the silence threshold never reach Gemini."""
+    gemini, _, call, run = gemini_round(pcm=bytes(3200))
+    await run(until=lambda: not call.audio_ring)  # drained, then skipped as silent
+
+    gemini.aio.models.generate_content.assert_not_awaited()
+
+
+@pytest.mark.parametrize("frame_only_every", [1, 3])
+async def test_gemini_session_task_triages_frame_when_silent(gemini_round, monkeypatch, frame_only_every):
+    """A silent round with a camera frame sends the frame alone, so an unresponsive caller is still triaged."""
+    monkeypatch.setattr("server.FRAME_ONLY_EVERY", frame_only_every)
+    gemini, sent, call, run = gemini_round(MagicMock(text='{"situation_summary": "Caller down"}'), pcm=bytes(3200))
+    call.latest_frame = b"\xff\xd8jpeg"
+    await run(until=lambda: sent)
+
+    contents = gemini.aio.models.generate_content.call_args.kwargs["contents"]
+    assert [part.inline_data.mime_type for part in contents[:-1]] == ["image/jpeg"]
+    assert contents[-1].text.startswith("No speech was detected")
+    assert sent[0]["report"] == {"situation_summary": "Caller down"}
+
+
+def test_is_silent_gates_on_loudest_window():
+    """Brief quiet speech inside an otherwise silent round is not averaged away."""
+    speech = array.array("h", [300, -300] * 1600).tobytes()  # 200ms at RMS 300
+    assert is_silent(bytes(320000))
+    assert not is_silent(bytes(160000) + speech + bytes(160000))
+
+
+async def test_gemini_rounds_survive_odd_length_pcm(gemini_round):
+    """A frame ending in a partial sample is carried into the next one, and later rounds still reach Gemini."""
+    gemini, sent, call, run = gemini_round(MagicMock(text='{"situation_summary": "ok"}'), pcm=b"")
+    generate = gemini.aio.models.generate_content
+    active_calls["test-call-gemini"] = call
+    ingest = AudioIngest("test-call-gemini", {})
+
+    ingest.push_pcm(memoryview(b"\x00\x10" * 1600 + b"\x00"))
+    assert len(call.audio_ring) == 3200
+
+    async def next_round():
+        await wait_for(lambda: generate.await_count == 1)
+        ingest.push_pcm(memoryview(b"\x10" + b"\x00\x10" * 1599))
+
+    feeder = asyncio.create_task(next_round())
+    await run(until=lambda: generate.await_count == 2)
+    await feeder
+    assert [m["report"]["situation_summary"] for m in sent] == ["ok", "ok"]
+
+
+async def test_gemini_session_task_reports_encoder_errors(gemini_round, monkeypatch):
+    """An audio encoding failure is reported like any failed round instead of ending the task."""
+    def broken_encoder(pcm):
+        raise ValueError("bad frame")
+
+    gemini, sent, _, run = gemini_round(MagicMock(text="{}"))
+    monkeypatch.setattr("server.encode_audio", broken_encoder)
+    await run(until=lambda: sent)
+
+    assert "ValueError" in sent[0]["report"]["situation_summary"]
+    gemini.aio.models.generate_content.assert_not_awaited()
+
+
 # ─── Test 2: Signal - call_initiated ──────────────────────────────────────────
 
-async def test_signal_call_initiated(aiohttp_client):
+async def test_signal_call_initiated(client):
     """Sending call_initiated creates an entry in active_calls with correct structure."""
-    app = create_app()
-    client = await aiohttp_client(app)
 
     call_id = "test-call-001"
     location = {"lat": 35.9, "lng": -79.0}
 
-    ws = await client.ws_connect(f"/ws/signal?call_id={call_id}&role=caller")
-    await ws.send_json({
-        "type": "call_initiated",
-        "call_id": call_id,
-        "location": location,
-    })
-
-    # Give the server a moment to process
-    await asyncio.sleep(0.05)
-
-    assert call_id in active_calls
+    ws, _ = await setup_call(client, call_id, location)
     call = active_calls[call_id]
-    assert call["location"] == location
-    assert call["dispatcher_ws"] is None
-    assert call["dashboard_ws"] is None
-    assert call["gemini_task"] is None
-    assert call["audio_queue"] is not None
-    assert isinstance(call["started_at"], float)
-    assert call["caller_ws"] is not None
+    assert (call.location, call.dispatcher_ws, call.dashboard_ws, call.gemini_task, call.latest_frame) == (
+        location, None, None, None, None,
+    )
+    assert call.caller_ws is not None and isinstance(call.audio_ring, PcmRing) and isinstance(call.started_at, float)
 
     await ws.close()
 
 
-# ─── Test 3: Signal - missing call_id ─────────────────────────────────────────
+# ─── Test 3: Invalid connects ─────────────────────────────────────────────────
 
-async def test_signal_missing_call_id_closes(aiohttp_client):
-    """Connecting to /ws/signal without call_id closes the WebSocket."""
-    app = create_app()
-    client = await aiohttp_client(app)
+@pytest.mark.parametrize("url", [
+    "/ws/signal",  # missing call_id
+    "/ws",
+    "/ws?call_id=bad-fmt&channels=two",  # audio params must be integers
+    "/ws/audio?call_id=bad-fmt&rate=fast",
+    "/ws/audio?call_id=bad-fmt&rate=0",  # and describe a format normalize_pcm handles
+    "/ws/audio?call_id=bad-fmt&rate=-16000",
+    "/ws/audio?call_id=bad-fmt&channels=0",
+    "/ws?call_id=bad-fmt&channels=3",
+    "/ws/audio?call_id=bad-fmt&byteorder=BIG",  # byteorder is "little" or "big", nothing else
+])
+async def test_invalid_connect_closes(client, url):
+    """Connecting without call_id, or with malformed or unsupported audio parameters, closes the WebSocket."""
 
-    ws = await client.ws_connect("/ws/signal")
+    ws = await client.ws_connect(url)
 
     # Server should close the connection
     msg = await ws.receive()
@@ -81,73 +339,94 @@ async def test_signal_missing_call_id_closes(aiohttp_client):
 
 # ─── Test 4: Signal - duplicate call_id ───────────────────────────────────────
 
-async def test_signal_duplicate_call_id(aiohttp_client):
+async def test_signal_duplicate_call_id(joined_call):
     """Sending call_initiated twice with same call_id only creates one entry."""
-    app = create_app()
-    client = await aiohttp_client(app)
-
-    call_id = "test-call-dup"
-
-    ws = await client.ws_connect(f"/ws/signal?call_id={call_id}&role=caller")
 
-    await ws.send_json({"type": "call_initiated", "call_id": call_id, "location": {"lat": 0, "lng": 0}})
-    await asyncio.sleep(0.05)
-    assert call_id in active_calls
-    original_started_at = active_calls[call_id]["started_at"]
+    call_id, ws, dash_ws = joined_call
+    original_started_at = active_calls[call_id].started_at
 
-    # Send duplicate
-    await ws.send_json({"type": "call_initiated", "call_id": call_id, "location": {"lat": 1, "lng": 1}})
-    await asyncio.sleep(0.05)
+    # Send duplicate, then an ICE candidate: the socket is handled in order, so once the
+    # candidate reaches the dashboard the duplicate has been ignored (no second incoming_call)
+    await send_message(ws, {"type": "call_initiated", "call_id": call_id, "location": {"lat": 1, "lng": 1}})
+    ice = {"type": "ice", "call_id": call_id, "candidate": "candidate:1 1 udp 1 127.0.0.1 9 typ host"}
+    assert await exchange(ws, ice, receive_dashboard(dash_ws)) == ice
 
     # Should still be the original entry (location unchanged)
-    assert active_calls[call_id]["started_at"] == original_started_at
-    assert active_calls[call_id]["location"] == {"lat": 0, "lng": 0}
-
-    await ws.close()
+    assert active_calls[call_id].started_at == original_started_at
+    assert active_calls[call_id].location == {"lat": 0, "lng": 0}
 
 
 # ─── Test 5: Dashboard connect/disconnect ─────────────────────────────────────
 
-async def test_dashboard_connect_disconnect(aiohttp_client):
+async def test_dashboard_connect_disconnect(client):
     """Connecting to /ws/dashboard adds to dispatcher_connections; disconnecting removes."""
-    app = create_app()
-    client = await aiohttp_client(app)
 
     assert len(dispatcher_connections) == 0
 
     ws = await client.ws_connect("/ws/dashboard")
-    await asyncio.sleep(0.05)
-    assert len(dispatcher_connections) == 1
+    await wait_for(lambda: len(dispatcher_connections) == 1)
+
+    await ws.close()
+    await wait_for(lambda: len(dispatcher_connections) == 0)
+
+
+async def test_dashboard_ignores_non_object_json(client):
+    """Valid JSON that isn't an object is skipped, and the dashboard still tears down on close."""
+
+    dash_ws = await client.ws_connect("/ws/dashboard")
+    await wait_for(lambda: len(dispatcher_connections) == 1)
+    server_dash = next(iter(dispatcher_connections))
+    caller_ws, _ = await setup_call(client, "non-object", dash_ws=dash_ws)
+
+    await dash_ws.send_str("[1]")
+    joined = _DISPATCHER_JOINED % "non-object"
+    assert (await exchange(dash_ws, joined, receive_message(caller_ws)))["type"] == "dispatcher_ready"
+
+    await dash_ws.close()
+    await wait_for(lambda: server_dash not in dashboard_outboxes)
+    assert server_dash not in dispatcher_connections
+    await caller_ws.close()
+
+
+# ─── Test 5b: Dashboard outbox batching ───────────────────────────────────────
+
+async def test_dashboard_batches_queued_messages(client):
+    """Messages queued for a dashboard before its writer runs arrive as one JSON array frame."""
+
+    ws = await client.ws_connect("/ws/dashboard")
+    await wait_for(lambda: len(dispatcher_connections) == 1)
+    server_ws = next(iter(dispatcher_connections))
+
+    send_to_dashboard(server_ws, {"type": "vitals", "call_id": "a", "hr": 80})
+    send_to_dashboard(server_ws, {"type": "vitals", "call_id": "a", "hr": 81})
+
+    batch = await receive_message(ws)
+    assert [m["hr"] for m in batch] == [80, 81]
 
     await ws.close()
-    await asyncio.sleep(0.05)
-    assert len(dispatcher_connections) == 0
 
 
 # ─── Test 6: Dashboard - incoming_call notification ───────────────────────────
 
-async def test_dashboard_receives_incoming_call(aiohttp_client):
+async def test_dashboard_receives_incoming_call(client):
     """When a call is initiated, all connected dashboard clients receive incoming_call."""
-    app = create_app()
-    client = await aiohttp_client(app)
 
     # Connect dashboard first
     dash_ws = await client.ws_connect("/ws/dashboard")
-    await asyncio.sleep(0.05)
+    await wait_for(lambda: len(dispatcher_connections) == 1)
 
     call_id = "test-call-notify"
     location = {"lat": 35.9, "lng": -79.0}
 
     # Connect caller and initiate call
     caller_ws = await client.ws_connect(f"/ws/signal?call_id={call_id}&role=caller")
-    await caller_ws.send_json({
+    msg = await exchange(caller_ws, {
         "type": "call_initiated",
         "call_id": call_id,
         "location": location,
-    })
+    }, receive_dashboard(dash_ws))
 
     # Dashboard should receive incoming_call
-    msg = await dash_ws.receive_json()
     assert msg["type"] == "incoming_call"
     assert msg["call_id"] == call_id
     assert msg["location"] == location
@@ -156,73 +435,71 @@ async def test_dashboard_receives_incoming_call(aiohttp_client):
     await dash_ws.close()
 
 
-# ─── Test 7: Dashboard - dispatcher_joined ────────────────────────────────────
+# ─── Test 6b: Community alert fan-out ─────────────────────────────────────────
 
-@patch("server.gemini_session_task", new=_noop_gemini_session_task)
-async def test_dispatcher_joined(aiohttp_client):
-    """dispatcher_joined sets dashboard_ws and sends dispatcher_ready to caller."""
-    app = create_app()
-    client = await aiohttp_client(app)
+async def test_alert_subscribers_receive_community_alert(client):
+    """A new call pushes community_alert to every /ws/alerts subscriber and counts them."""
 
-    call_id = "test-call-join"
+    subscribers = [await client.ws_connect("/ws/alerts") for _ in range(2)]
+    await wait_for(lambda: len(alert_subscribers) == 2)
 
-    # Connect dashboard FIRST so it receives incoming_call
-    dash_ws = await client.ws_connect("/ws/dashboard")
-    await asyncio.sleep(0.05)
+    call_id = "test-call-alert"
+    caller_ws, _ = await setup_call(client, call_id, {"lat": 35.9, "lng": -79.0})
 
-    # Connect caller and initiate
-    caller_ws = await client.ws_connect(f"/ws/signal?call_id={call_id}&role=caller")
-    await caller_ws.send_json({
-        "type": "call_initiated",
-        "call_id": call_id,
-        "location": {"lat": 0, "lng": 0},
-    })
+    for sub in subscribers:
+        alert = await receive_message(sub)
+        assert alert["type"] == "community_alert"
+        assert alert["report_count"] == 1
+    # The count is recorded once the sends complete, which can be after the subscribers read them
+    incident = incidents[active_calls[call_id].incident_id]
+    await wait_for(lambda: incident["alerted_count"] == 2)
+
+    for sub in subscribers:
+        await sub.close()
+    await caller_ws.close()
 
-    # Read the incoming_call notification
-    incoming = await dash_ws.receive_json()
-    assert incoming["type"] == "incoming_call"
 
-    await dash_ws.send_json({"type": "dispatcher_joined", "call_id": call_id})
-    await asyncio.sleep(0.05)
+# ─── Test 7: Dashboard - dispatcher_joined ────────────────────────────────────
+
+async def test_dispatcher_joined(client):
+    """dispatcher_joined sets dashboard_ws and sends dispatcher_ready to caller."""
+
+    call_id = "test-call-join"
+    caller_ws, dash_ws = await setup_call(client, call_id, with_dashboard=True)
+
+    ready_msg = await exchange(dash_ws, {"type": "dispatcher_joined", "call_id": call_id}, receive_message(caller_ws))
 
     # Caller should receive dispatcher_ready
-    ready_msg = await caller_ws.receive_json()
     assert ready_msg["type"] == "dispatcher_ready"
     assert ready_msg["call_id"] == call_id
 
     # dashboard_ws should be set on the call
-    assert active_calls[call_id]["dashboard_ws"] is not None
+    assert active_calls[call_id].dashboard_ws is not None
 
     await caller_ws.close()
     await dash_ws.close()
 
 
-# ─── Test 8: Vitals forwarding ────────────────────────────────────────────────
+# ─── Test 7b: SDP/ICE relay ───────────────────────────────────────────────────
 
-@patch("server.gemini_session_task", new=_noop_gemini_session_task)
-async def test_vitals_forwarding(aiohttp_client):
-    """Vitals sent to /ws/vitals are forwarded to the dashboard_ws."""
-    app = create_app()
-    client = await aiohttp_client(app)
+async def test_signaling_relayed_between_caller_and_dashboard(joined_call):
+    """Caller SDP reaches the dashboard unchanged, and the dashboard's answer reaches the caller."""
 
-    call_id = "test-call-vitals"
+    call_id, caller_ws, dash_ws = joined_call
 
-    # Connect dashboard FIRST
-    dash_ws = await client.ws_connect("/ws/dashboard")
-    await asyncio.sleep(0.05)
+    offer = {"type": "offer", "call_id": call_id, "sdp": "v=0\r\no=- 1 2 IN IP4 127.0.0.1\r\n"}
+    assert await exchange(caller_ws, offer, receive_dashboard(dash_ws)) == offer
 
-    # Set up caller
-    caller_ws = await client.ws_connect(f"/ws/signal?call_id={call_id}&role=caller")
-    await caller_ws.send_json({
-        "type": "call_initiated",
-        "call_id": call_id,
-        "location": {"lat": 0, "lng": 0},
-    })
-    _ = await dash_ws.receive_json()  # incoming_call
+    answer = {"type": "answer", "call_id": call_id, "sdp": "v=0\r\n"}
+    assert await exchange(dash_ws, answer, receive_message(caller_ws)) == answer
+
+
+# ─── Test 8: Vitals forwarding ────────────────────────────────────────────────
+
+async def test_vitals_forwarding(client, joined_call):
+    """Vitals sent to /ws/vitals are forwarded to the dashboard_ws."""
 
-    await dash_ws.send_json({"type": "dispatcher_joined", "call_id": call_id})
-    await asyncio.sleep(0.05)
-    _ = await caller_ws.receive_json()  # dispatcher_ready
+    call_id, caller_ws, dash_ws = joined_call
 
     # Send vitals
     vitals_ws = await client.ws_connect(f"/ws/vitals?call_id={call_id}")
@@ -235,180 +512,223 @@ async def test_vitals_forwarding(aiohttp_client):
         "breathingConfidence": 0.85,
         "timestamp": 1234567890,
     }
-    await vitals_ws.send_json(vitals_data)
-    await asyncio.sleep(0.05)
+    msg = await exchange(vitals_ws, vitals_data, receive_dashboard(dash_ws))
 
     # Dashboard should receive vitals
-    msg = await dash_ws.receive_json()
     assert msg["type"] == "vitals"
     assert msg["call_id"] == call_id
     assert msg["hr"] == 118
     assert msg["breathing"] == 22
 
     await vitals_ws.close()
-    await caller_ws.close()
-    await dash_ws.close()
+
+
+# ─── Test 8b: Vitals payload splicing ─────────────────────────────────────────
+
+@pytest.mark.parametrize("raw", [
+    b'{"hr":72,"breathing":16,"hrConfidence":0.9}',
+    b'{"type":"vitals","call_id":"abc","hr":72,"breathing":16,"hrConfidence":0.9}',  # as sent by iOS
+    b"{}",
+])
+def test_vitals_payload_matches_full_serialization(raw, monkeypatch):
+    """Forwarded vitals are byte-identical to a full dumps, with no duplicate type/call_id keys."""
+    sent = []
+    monkeypatch.setattr("server._enqueue_dashboard", lambda ws, payload: sent.append(payload))
+    active_calls["abc"] = call = CallState(
+        caller_ws=None, audio_ring=PcmRing(8), location={}, started_at=0.0,
+        vitals_prefix=orjson.dumps({"type": "vitals", "call_id": "abc"})[:-1] + b",",
+    )
+
+    on_vitals_message("abc", raw)
+    reading = {k: v for k, v in orjson.loads(raw).items() if k not in ("type", "call_id")}
+    expected = orjson.dumps({"type": "vitals", "call_id": "abc", **reading})
+    assert sent == [expected]
+    assert vitals_payload(call.vitals_prefix, call.last_vitals) == expected  # dispatcher_joined replay
 
 
 # ─── Test 9: Audio WebSocket - binary PCM ─────────────────────────────────────
 
-async def test_audio_binary_pcm(aiohttp_client):
-    """Binary data sent to /ws/audio is enqueued in audio_queue."""
-    app = create_app()
-    client = await aiohttp_client(app)
+async def test_audio_binary_pcm(client):
+    """PCM-tagged binary data sent to /ws/audio is buffered in the call's audio_ring."""
 
     call_id = "test-call-audio"
-
-    # Set up call
-    caller_ws = await client.ws_connect(f"/ws/signal?call_id={call_id}&role=caller")
-    await caller_ws.send_json({
-        "type": "call_initiated",
-        "call_id": call_id,
-        "location": {"lat": 0, "lng": 0},
-    })
-    await asyncio.sleep(0.05)
+    caller_ws, _ = await setup_call(client, call_id)
 
     # Send binary audio
     audio_ws = await client.ws_connect(f"/ws/audio?call_id={call_id}")
-    pcm_data = b"\x00\x01\x02\x03" * 100
-    await audio_ws.send_bytes(pcm_data)
-    await asyncio.sleep(0.05)
+    await audio_ws.send_bytes(b"\x00" + _PCM)
 
-    # Check queue
-    queue = active_calls[call_id]["audio_queue"]
-    assert not queue.empty()
-    item = await queue.get()
-    assert item["type"] == "audio"
-    assert item["data"] == pcm_data
+    ring = active_calls[call_id].audio_ring
+    await wait_for(lambda: ring)
+    assert len(ring) == len(_PCM)
+    assert ring.drain() == _PCM
 
     await audio_ws.close()
     await caller_ws.close()
 
 
-# ─── Test 10: Audio WebSocket - frame JSON ────────────────────────────────────
+# ─── Test 10: Audio WebSocket - frames ────────────────────────────────────────
 
-async def test_audio_frame_json(aiohttp_client):
-    """JSON frame messages sent to /ws/audio are enqueued in audio_queue."""
-    app = create_app()
-    client = await aiohttp_client(app)
+async def test_audio_frame_binary(client):
+    """JPEG-tagged binary frames on /ws/audio replace the call's latest_frame."""
 
-    call_id = "test-call-frame"
+    call_id = "test-call-frame-bin"
+    caller_ws, _ = await setup_call(client, call_id)
+
+    audio_ws = await client.ws_connect(f"/ws/audio?call_id={call_id}")
+    jpeg = b"\xff\xd8\xff\xe0fake-jpeg"
+    await audio_ws.send_bytes(b"\x01" + jpeg)
+
+    call = active_calls[call_id]
+    await wait_for(lambda: call.latest_frame is not None)
+    assert call.latest_frame == jpeg
+    assert not call.audio_ring  # frames bypass the audio ring
+
+    await audio_ws.close()
+    await caller_ws.close()
 
-    # Set up call
-    caller_ws = await client.ws_connect(f"/ws/signal?call_id={call_id}&role=caller")
-    await caller_ws.send_json({
-        "type": "call_initiated",
-        "call_id": call_id,
-        "location": {"lat": 0, "lng": 0},
-    })
-    await asyncio.sleep(0.05)
 
-    # Send frame
+async def test_audio_text_frames_ignored(client):
+    """/ws/audio is binary-only: legacy JSON frame messages no longer touch latest_frame."""
+
+    call_id = "test-call-frame"
+    caller_ws, _ = await setup_call(client, call_id)
+
     audio_ws = await client.ws_connect(f"/ws/audio?call_id={call_id}")
-    frame_b64 = "iVBORw0KGgoAAAANSUhEUg=="  # Fake base64 JPEG
-    await audio_ws.send_json({"type": "frame", "data": frame_b64})
-    await asyncio.sleep(0.05)
+    await send_message(audio_ws, {"type": "frame", "data": "iVBORw0KGgoAAAANSUhEUg=="})
+    await audio_ws.send_bytes(b"\x00" + b"\x01\x00")  # handled in order, after the text frame
 
-    # Check queue
-    queue = active_calls[call_id]["audio_queue"]
-    assert not queue.empty()
-    item = await queue.get()
-    assert item["type"] == "frame"
-    assert item["data"] == frame_b64
+    call = active_calls[call_id]
+    await wait_for(lambda: call.audio_ring)
+    assert call.latest_frame is None
 
     await audio_ws.close()
     await caller_ws.close()
 
 
-# ─── Test 11: Cleanup ─────────────────────────────────────────────────────────
+# ─── Test 10b: PCM ring overflow ──────────────────────────────────────────────
+
+@pytest.mark.parametrize("writes, expected", [
+    ([b"ab", b"cd"], b"abcd"),
+    ([b"abc", b"def"], b"cdef"),  # wraps, dropping the oldest bytes
+    ([b"abcdefgh"], b"efgh"),  # single write larger than the ring
+])
+def test_pcm_ring_keeps_newest_audio(writes, expected):
+    """A full ring overwrites its oldest audio instead of blocking the socket reader."""
+    ring = PcmRing(4)
+    for data in writes:
+        ring.write(memoryview(data))
+
+    assert ring.dropped == sum(map(len, writes)) - len(expected)
+    assert ring.drain() == expected
+    assert len(ring) == 0
+
+
+def test_pcm_overflow_warning_is_rate_limited(caplog):
+    """Overflows within OVERFLOW_LOG_INTERVAL log once; the next warning reports every byte dropped since."""
+    call = CallState(caller_ws=None, audio_ring=PcmRing(8), location={}, started_at=0.0)
+    active_calls["test-call-overflow"] = call
+    ingest = AudioIngest("test-call-overflow", {})
+    frame = b"\x01\x00" * 4  # one ring's worth: every write after the first drops 8 bytes
+
+    with caplog.at_level(logging.WARNING, logger="server"):
+        for _ in range(4):
+            ingest.push_pcm(frame)
+        assert [r.getMessage() for r in caplog.records] == [
+            "[test-call-overflow] PCM ring full, dropped 8 bytes of stale audio",
+        ]
+        assert call.audio_ring.dropped == 16  # accumulating until the interval passes
+
+        caplog.clear()
+        ingest.last_overflow_log -= OVERFLOW_LOG_INTERVAL
+        ingest.push_pcm(frame)
+        assert [r.getMessage() for r in caplog.records] == [
+            "[test-call-overflow] PCM ring full, dropped 24 bytes of stale audio",
+        ]
+        assert call.audio_ring.dropped == 0
 
-async def test_cleanup_call(aiohttp_client):
-    """cleanup_call removes from active_calls and notifies connected parties."""
-    app = create_app()
-    client = await aiohttp_client(app)
 
-    call_id = "test-call-cleanup"
+# ─── Test 11: Cleanup ─────────────────────────────────────────────────────────
 
-    # Connect dashboard FIRST
-    dash_ws = await client.ws_connect("/ws/dashboard")
-    await asyncio.sleep(0.05)
+async def test_cleanup_call(joined_call):
+    """cleanup_call removes from active_calls and notifies connected parties."""
 
-    # Set up a full call
-    caller_ws = await client.ws_connect(f"/ws/signal?call_id={call_id}&role=caller")
-    await caller_ws.send_json({
-        "type": "call_initiated",
-        "call_id": call_id,
-        "location": {"lat": 0, "lng": 0},
-    })
-    _ = await dash_ws.receive_json()  # incoming_call
-    assert call_id in active_calls
-
-    # Join via dispatcher_joined flow with mocked gemini
-    with patch("server.gemini_session_task", new=_noop_gemini_session_task):
-        await dash_ws.send_json({"type": "dispatcher_joined", "call_id": call_id})
-        await asyncio.sleep(0.05)
-        _ = await caller_ws.receive_json()  # dispatcher_ready
-
-    # Now cleanup
+    call_id, caller_ws, dash_ws = joined_call
     await cleanup_call(call_id, reason="test_cleanup")
 
     assert call_id not in active_calls
 
-    # Dashboard should receive call_ended
-    ended_msg = await dash_ws.receive_json()
+    # Last call in the incident closes it, then dashboard should receive call_ended
+    closed_msg = await receive_dashboard(dash_ws)
+    assert closed_msg["type"] == "incident_closed"
+    ended_msg = await receive_dashboard(dash_ws)
     assert ended_msg["type"] == "call_ended"
     assert ended_msg["call_id"] == call_id
     assert ended_msg["reason"] == "test_cleanup"
 
     # Caller should receive call_ended
-    caller_ended = await caller_ws.receive_json()
+    caller_ended = await receive_message(caller_ws)
     assert caller_ended["type"] == "call_ended"
     assert caller_ended["call_id"] == call_id
 
-    await caller_ws.close()
-    await dash_ws.close()
+
+async def test_cleanup_call_does_not_wait_on_stuck_gemini_task(monkeypatch):
+    """A Gemini task that ignores cancellation only delays cleanup by GEMINI_CANCEL_TIMEOUT."""
+    monkeypatch.setattr("server.GEMINI_CANCEL_TIMEOUT", 0.05)
+    release = asyncio.Event()
+
+    async def stubborn():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            await release.wait()  # e.g. a request that won't unwind promptly
+
+    call = CallState(caller_ws=None, audio_ring=PcmRing(64), location={}, started_at=0.0)
+    call.gemini_task = asyncio.create_task(stubborn())
+    active_calls["test-call-stuck"] = call
+    await asyncio.sleep(0)
+
+    await asyncio.wait_for(cleanup_call("test-call-stuck"), timeout=1.0)
+    assert "test-call-stuck" not in active_calls
+    assert call.audio_ring.closed
+
+    release.set()
+    await call.gemini_task
 
 
 # ─── Test 12: End-to-end call lifecycle ───────────────────────────────────────
 
-@patch("server.gemini_session_task", new=_noop_gemini_session_task)
-async def test_end_to_end_lifecycle(aiohttp_client):
+async def test_end_to_end_lifecycle(client):
     """Full flow: call_initiated -> dispatcher_joined -> vitals -> call_ended."""
-    app = create_app()
-    client = await aiohttp_client(app)
 
     call_id = "test-call-e2e"
     location = {"lat": 35.9132, "lng": -79.0558}
 
-    # 1. Dashboard connects first
-    dash_ws = await client.ws_connect("/ws/dashboard")
-    await asyncio.sleep(0.05)
+    # 1. Dashboard and the caller's sockets connect; the handshakes are independent
+    dash_ws, caller_ws, vitals_ws = await asyncio.gather(
+        client.ws_connect("/ws/dashboard"),
+        client.ws_connect(f"/ws/signal?call_id={call_id}&role=caller"),
+        client.ws_connect(f"/ws/vitals?call_id={call_id}"),
+    )
+    await wait_for(lambda: len(dispatcher_connections) == 1)
 
-    # 2. Caller initiates call
-    caller_ws = await client.ws_connect(f"/ws/signal?call_id={call_id}&role=caller")
-    await caller_ws.send_json({
+    # 2. Caller initiates call; dashboard receives incoming_call
+    incoming = await exchange(caller_ws, {
         "type": "call_initiated",
         "call_id": call_id,
         "location": location,
-    })
-
-    # Dashboard receives incoming_call
-    incoming = await dash_ws.receive_json()
+    }, receive_dashboard(dash_ws))
     assert incoming["type"] == "incoming_call"
     assert incoming["call_id"] == call_id
     assert incoming["location"] == location
+    _ = await receive_dashboard(dash_ws)  # incident_update
 
-    # 3. Dispatcher joins
-    await dash_ws.send_json({"type": "dispatcher_joined", "call_id": call_id})
-    await asyncio.sleep(0.05)
-
-    # Caller receives dispatcher_ready
-    ready = await caller_ws.receive_json()
+    # 3. Dispatcher joins; caller receives dispatcher_ready
+    ready = await exchange(dash_ws, {"type": "dispatcher_joined", "call_id": call_id}, receive_message(caller_ws))
     assert ready["type"] == "dispatcher_ready"
 
     # 4. Vitals flow
-    vitals_ws = await client.ws_connect(f"/ws/vitals?call_id={call_id}")
-    await vitals_ws.send_json({
+    vitals_msg = await exchange(vitals_ws, {
         "type": "vitals",
         "call_id": call_id,
         "hr": 95,
@@ -416,23 +736,121 @@ async def test_end_to_end_lifecycle(aiohttp_client):
         "breathing": 18,
         "breathingConfidence": 0.82,
         "timestamp": int(time.time()),
-    })
-    await asyncio.sleep(0.05)
-
-    vitals_msg = await dash_ws.receive_json()
+    }, receive_dashboard(dash_ws))
     assert vitals_msg["type"] == "vitals"
     assert vitals_msg["hr"] == 95
 
-    # 5. Call ends (from dashboard)
-    await dash_ws.send_json({"type": "call_ended", "call_id": call_id})
-    await asyncio.sleep(0.05)
+    # 5. Call ends (from dashboard); caller receives call_ended
+    ended = await exchange(dash_ws, {"type": "call_ended", "call_id": call_id}, receive_message(caller_ws))
+    assert ended["type"] == "call_ended"
+    await wait_for(lambda: call_id not in active_calls)
 
-    assert call_id not in active_calls
+    await asyncio.gather(vitals_ws.close(), caller_ws.close(), dash_ws.close())
 
-    # Caller receives call_ended
-    ended = await caller_ws.receive_json()
-    assert ended["type"] == "call_ended"
 
-    await vitals_ws.close()
+# ─── Test 13: Audio format normalization ──────────────────────────────────────
+
+async def test_audio_big_endian_stereo_is_normalized(client):
+    """Big-endian stereo PCM is byteswapped and downmixed to host-order mono before buffering."""
+
+    caller_ws, _ = await setup_call(client, "fmt-test")
+
+    # Interleaved stereo frames (L, R) in big-endian order
+    stereo = array.array("h", [100, 300, -200, -400, 1000, 3000])
+    stereo.byteswap()
+    audio_ws = await client.ws_connect("/ws/audio?call_id=fmt-test&byteorder=big&channels=2")
+    await audio_ws.send_bytes(b"\x00" + stereo.tobytes())
+
+    ring = active_calls["fmt-test"].audio_ring
+    await wait_for(lambda: ring)
+    pcm = ring.drain()
+    assert array.array("h", pcm).tolist() == [200, -300, 2000]
+
+    await audio_ws.close()
     await caller_ws.close()
-    await dash_ws.close()
+
+
+async def test_audio_socket_opened_before_call_initiated(client):
+    """An audio socket opened before call_initiated binds to the call once it exists."""
+
+    # iOS connects /ws/audio before the signal server registers the call
+    audio_ws = await client.ws_connect("/ws/audio?call_id=early-audio")
+    await audio_ws.send_bytes(b"\x00" + b"\x01\x00" * 4)  # dropped: no call yet
+
+    caller_ws, _ = await setup_call(client, "early-audio")
+
+    await audio_ws.send_bytes(b"\x00" + b"\x02\x00" * 4)
+
+    ring = active_calls["early-audio"].audio_ring
+    await wait_for(lambda: ring)
+    assert ring.drain() == b"\x02\x00" * 4
+
+    await audio_ws.close()
+    await caller_ws.close()
+
+
+async def test_audio_sample_split_across_frames(client):
+    """A sample split across two PCM frames is rejoined, keeping the stream sample-aligned."""
+
+    caller_ws, _ = await setup_call(client, "split-sample")
+    audio_ws = await client.ws_connect("/ws/audio?call_id=split-sample")
+    pcm = array.array("h", [1000] * 3).tobytes()
+    await audio_ws.send_bytes(b"\x00" + pcm[:3])  # ends halfway through the second sample
+    await audio_ws.send_bytes(b"\x00" + pcm[3:])
+
+    ring = active_calls["split-sample"].audio_ring
+    await wait_for(lambda: len(ring) == len(pcm))
+    assert array.array("h", ring.drain()).tolist() == [1000, 1000, 1000]
+
+    await audio_ws.close()
+    await caller_ws.close()
+
+
+async def test_audio_rebinds_to_reregistered_call(client):
+    """An audio socket that outlives its call feeds the call registered next under the same call_id."""
+
+    caller_ws, _ = await setup_call(client, "rebind")
+    audio_ws = await client.ws_connect("/ws/audio?call_id=rebind")
+    await audio_ws.send_bytes(b"\x00" + _PCM)
+    old_ring = active_calls["rebind"].audio_ring
+    await wait_for(lambda: len(old_ring) == len(_PCM))
+
+    await cleanup_call("rebind")
+    await caller_ws.close()
+    caller_ws, _ = await setup_call(client, "rebind")
+    new_ring = active_calls["rebind"].audio_ring
+    await audio_ws.send_bytes(b"\x00" + _PCM)
+    await wait_for(lambda: len(new_ring) == len(_PCM))
+    assert len(old_ring) == len(_PCM)
+
+    await audio_ws.close()
+    await caller_ws.close()
+
+
+# ─── Test 14: Multiplexed caller socket ───────────────────────────────────────
+
+async def test_multiplexed_caller_socket(client):
+    """/ws carries signal, vitals, PCM and frames on one socket, and closing it ends the call."""
+    call_id = "mux-test"
+
+    ws = await client.ws_connect(f"/ws?call_id={call_id}")
+    await ws.send_bytes(b"\x00" + orjson.dumps({
+        "type": "call_initiated",
+        "call_id": call_id,
+        "location": {"lat": 1.0, "lng": 2.0},
+    }))
+    await ws.send_bytes(b"\x02" + orjson.dumps({"hr": 80, "breathing": 14}))
+    await ws.send_bytes(b"\x01" + b"\x03\x00" * 4)
+    await ws.send_bytes(b"\x03" + b"\xff\xd8jpeg")
+
+    await wait_for(lambda: call_id in active_calls and active_calls[call_id].latest_frame)
+    call = active_calls[call_id]
+    assert call.caller_ws is not None
+    assert call.location == {"lat": 1.0, "lng": 2.0}
+    assert call.last_vitals == {"hr": 80, "breathing": 14}
+    assert call.latest_frame == b"\xff\xd8jpeg"
+    assert call.audio_ring.drain() == b"\x03\x00" * 4
+
+    # Closing the single caller connection ends the call
+    await ws.close()
+    await wait_for(lambda: call_id not in active_calls)